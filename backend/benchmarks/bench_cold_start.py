@@ -0,0 +1,184 @@
+"""Cold-start benchmark: import time and first-request latency.
+
+Each run starts a fresh interpreter that imports `server`, enters the app
+lifespan and sends its first requests through httpx's ASGI transport, which is
+what a new worker or serverless instance does before it serves traffic. The
+report gives medians over the runs, whether modules meant to load lazily
+(NumPy, httpx) were imported by `import server`, the slowest imports under
+`server` (from `python -X importtime`) and whether import + startup + first
+request fits in --budget-ms.
+
+The database is mongomock-motor by default, or a local mongod when
+--mongo-url is given, in which case startup includes connecting and the
+warm-up ping (a throwaway database is created and dropped).
+
+Usage (from the backend directory):
+    pip install mongomock-motor
+    python benchmarks/bench_cold_start.py --runs 5
+    python benchmarks/bench_cold_start.py --mongo-url mongodb://localhost:27017 --budget-ms 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+LAZY_MODULES = ("numpy", "httpx")
+DATE = "2026-03-02"
+
+
+async def seed(database):
+    """One user with a session and a day of appointments; returns auth headers"""
+    token = uuid.uuid4().hex
+    await database.users.insert_one({"user_id": "cold_user", "email": "cold@example.com", "name": "Cold Start"})
+    await database.user_sessions.insert_one({
+        "session_token": token, "user_id": "cold_user",
+        "expires_at": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+    })
+    await database.appointments.insert_many([{
+        "id": uuid.uuid4().hex, "user_id": "cold_user", "client_id": "c1",
+        "property_address": f"{100 + i} Elm St", "city": "Springfield", "date": DATE,
+        "start_time": f"{9 + i}:00", "end_time": f"{9 + i}:45", "time_at_house": 45,
+        "latitude": 40.7 + i * 0.01, "longitude": -74.0 - i * 0.01,
+    } for i in range(8)])
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def timed(http, method: str, path: str, headers: dict) -> float:
+    started = time.perf_counter()
+    response = await http.request(method, path, headers=headers)
+    elapsed = (time.perf_counter() - started) * 1000
+    if response.status_code != 200:
+        raise RuntimeError(f"{method} {path} returned {response.status_code}")
+    return elapsed
+
+
+async def serve_first_requests(server, mongo_url, timings: dict):
+    import httpx
+
+    mongo_client = None
+    if not mongo_url:
+        from mongomock_motor import AsyncMongoMockClient
+
+        mongo_client = AsyncMongoMockClient()
+        server.db = mongo_client["estate_cold_start"]
+
+    started = time.perf_counter()
+    async with server.lifespan(server.app):
+        timings["startup_ms"] = (time.perf_counter() - started) * 1000
+        headers = await seed(server.db)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://cold-start") as http:
+            requests = [("GET", f"/api/appointments?date={DATE}"), ("POST", f"/api/optimize-route?date={DATE}")]
+            for label in ("first", "warm"):
+                for method, path in requests:
+                    name = path.split("?")[0].rsplit("/", 1)[-1]
+                    timings[f"{label}_{name}_ms"] = await timed(http, method, path, headers)
+        if mongo_url:
+            await server.client.drop_database(server.db.name)
+
+
+def child(args):
+    """Runs in a fresh interpreter and prints its timings as JSON"""
+    sys.path.insert(0, str(BACKEND_DIR))
+    if args.mongo_url:
+        os.environ["MONGO_URL"] = args.mongo_url
+        os.environ["DB_NAME"] = f"estate_coldstart_{uuid.uuid4().hex[:8]}"
+    else:
+        # mongomock has no secondaries to route list reads to
+        os.environ.setdefault("MONGO_LIST_READ_PREFERENCE", "primary")
+    os.environ.setdefault("REMINDER_SCAN_SECONDS", "0")
+
+    started = time.perf_counter()
+    import server
+
+    timings = {"import_ms": (time.perf_counter() - started) * 1000}
+    loaded = {name: name in sys.modules for name in LAZY_MODULES}
+    asyncio.run(serve_first_requests(server, args.mongo_url, timings))
+    print(json.dumps({"timings": timings, "loaded_by_import": loaded}))
+
+
+def slowest_imports(limit: int) -> list:
+    """Modules imported directly by `server`, by cumulative import time"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"],
+                            cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    # A module's line follows those of the modules it imported, so the depth-1
+    # lines just before the `server` line are its direct imports
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == "server":
+                break
+            children = []
+        elif depth == 1:
+            children.append({"module": name.strip(), "cumulative_ms": round(int(cumulative) / 1000, 1)})
+    return sorted(children, key=lambda item: -item["cumulative_ms"])[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend import time and first-request latency")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument("--mongo-url", help="use this mongod instead of mongomock-motor")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="target for import + startup + first request")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+    if not args.mongo_url:
+        try:
+            import mongomock_motor  # noqa: F401
+        except ImportError:
+            sys.exit("mongomock-motor is not installed; pip install mongomock-motor or pass --mongo-url")
+
+    command = [sys.executable, __file__, "--child"] + (["--mongo-url", args.mongo_url] if args.mongo_url else [])
+    runs = []
+    for _ in range(args.runs):
+        result = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            sys.exit(f"cold start run failed:\n{result.stderr}")
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    medians = {
+        name: round(statistics.median(run["timings"][name] for run in runs), 2)
+        for name in runs[0]["timings"]
+    }
+    cold_start = medians["import_ms"] + medians["startup_ms"] + medians["first_appointments_ms"]
+    report = {
+        "benchmark": "cold_start",
+        "python": platform.python_version(),
+        "backend": "mongod" if args.mongo_url else "mongomock",
+        "runs": args.runs,
+        "median_ms": medians,
+        "cold_start_ms": round(cold_start, 2),
+        "budget_ms": args.budget_ms,
+        "within_budget": cold_start <= args.budget_ms,
+        "loaded_by_import": {name: any(run["loaded_by_import"][name] for run in runs) for name in LAZY_MODULES},
+        "slowest_imports": slowest_imports(args.top),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
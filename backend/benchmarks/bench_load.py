@@ -0,0 +1,292 @@
+"""In-process load test for the FastAPI app.
+
+Drives `server.app` through httpx's ASGI transport, so no network, uvicorn or
+public service is involved. The database is mongomock-motor by default, or a
+local mongod when --mongo-url is given (a throwaway database is created and
+dropped). Reports throughput, latency percentiles and MongoDB operation
+counts per endpoint as JSON.
+
+Usage (from the backend directory):
+    pip install mongomock-motor
+    python benchmarks/bench_load.py --requests 5000 --concurrency 32
+    python benchmarks/bench_load.py --mongo-url mongodb://localhost:27017 --mix auth_me=1,optimize=1
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# A single mongod (or mongomock) has no secondaries; read lists from it directly
+os.environ.setdefault("MONGO_LIST_READ_PREFERENCE", "primary")
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+
+DATES = ["2026-03-02", "2026-03-03", "2026-03-04", "2026-03-05", "2026-03-06"]
+CITIES = ["Springfield", "Riverside", "Fairview", "Franklin", "Greenville"]
+
+# name -> (method, path, params builder)
+ENDPOINTS = {
+    "auth_me": ("GET", "/api/auth/me", lambda rng: None),
+    "appointments": ("GET", "/api/appointments", lambda rng: {"date": rng.choice(DATES)} if rng.random() < 0.7 else None),
+    "dashboard": ("GET", "/api/dashboard/stats", lambda rng: {"date": rng.choice(DATES)}),
+    "optimize": ("POST", "/api/optimize-route", lambda rng: {"date": rng.choice(DATES)}),
+}
+DEFAULT_MIX = "auth_me=4,appointments=3,dashboard=2,optimize=1"
+
+DB_OPERATIONS = {
+    "find", "find_one", "find_one_and_update", "find_one_and_delete", "insert_one", "insert_many",
+    "update_one", "update_many", "replace_one", "delete_one", "delete_many", "bulk_write",
+    "count_documents", "aggregate", "distinct",
+}
+
+current_endpoint = contextvars.ContextVar("current_endpoint", default="setup")
+
+
+class CountingCollection:
+    """Proxy that counts operations issued against a collection"""
+
+    def __init__(self, collection, counts):
+        self._collection = collection
+        self._counts = counts
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in DB_OPERATIONS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self._counts[current_endpoint.get()][f"{self._collection.name}.{name}"] += 1
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+class CountingDatabase:
+    """Proxy installed as `server.db` so every collection access is counted"""
+
+    def __init__(self, database, counts):
+        self._database = database
+        self._counts = counts
+
+    def __getattr__(self, name):
+        attr = getattr(self._database, name)
+        if hasattr(attr, "find_one"):
+            return CountingCollection(attr, self._counts)
+        if name == "command":
+            def counted(*args, **kwargs):
+                self._counts[current_endpoint.get()]["command"] += 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint in mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentiles(samples: list) -> dict:
+    """p50/p95/p99/max of latency samples, in milliseconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+async def seed(database, users: int, clients_per_user: int, appointments_per_user: int, rng: random.Random) -> list:
+    """Insert users, sessions, clients and appointments; returns session tokens"""
+    tokens = []
+    expires_at = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    for u in range(users):
+        user_id = f"load_user_{u}"
+        token = f"load_token_{uuid.uuid4().hex}"
+        tokens.append(token)
+        await database.users.insert_one({"user_id": user_id, "email": f"{user_id}@load.test", "name": f"Load {u}"})
+        await database.user_sessions.insert_one({"session_token": token, "user_id": user_id, "expires_at": expires_at})
+
+        client_ids = []
+        clients = []
+        for c in range(clients_per_user):
+            client_obj = server.Client(
+                name=f"Client {c}", phone="555-0100", phone_type="apple", email=f"c{c}@load.test",
+                current_address=f"{c} Main St", user_id=user_id,
+            )
+            client_ids.append(client_obj.id)
+            clients.append(client_obj.model_dump(mode="json"))
+        if clients:
+            await database.clients.insert_many(clients)
+
+        appointments = []
+        for _ in range(appointments_per_user):
+            start = rng.randrange(8 * 60, 17 * 60, 15)
+            duration = rng.choice([30, 45, 60])
+            has_coords = rng.random() > 0.1
+            appt = server.Appointment(
+                client_id=rng.choice(client_ids) if client_ids else "none",
+                property_address=f"{rng.randrange(1, 999)} Oak Ave",
+                city=rng.choice(CITIES),
+                date=rng.choice(DATES),
+                start_time=f"{start // 60:02d}:{start % 60:02d}",
+                end_time=f"{(start + duration) // 60:02d}:{(start + duration) % 60:02d}",
+                time_at_house=duration,
+                is_open_house=rng.random() < 0.2,
+                latitude=40.7 + rng.uniform(-0.3, 0.3) if has_coords else None,
+                longitude=-74.0 + rng.uniform(-0.3, 0.3) if has_coords else None,
+                user_id=user_id,
+            )
+            appointments.append(server.with_location(appt.model_dump(mode="json")))
+        if appointments:
+            await database.appointments.insert_many(appointments)
+    return tokens
+
+
+async def run_load(http, tokens: list, weights: dict, total: int, concurrency: int, rng: random.Random):
+    """Issue `total` requests from `concurrency` workers; returns per-endpoint samples and wall time"""
+    names = list(weights)
+    plan = rng.choices(names, weights=[weights[n] for n in names], k=total)
+    params = [ENDPOINTS[name][2](rng) for name in plan]
+    users = [rng.choice(tokens) for _ in plan]
+    queue = iter(range(total))
+
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+
+    async def worker():
+        for i in queue:
+            name = plan[i]
+            method, path, _ = ENDPOINTS[name]
+            current_endpoint.set(name)
+            started = time.perf_counter()
+            response = await http.request(
+                method, path, params=params[i], headers={"Authorization": f"Bearer {users[i]}"}
+            )
+            latencies[name].append(time.perf_counter() - started)
+            statuses[name][response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    weights = parse_mix(args.mix)
+
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        mongo_client = AsyncIOMotorClient(args.mongo_url)
+        db_name = f"estate_loadtest_{uuid.uuid4().hex[:8]}"
+        backend = "mongod"
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("mongomock-motor is not installed; pip install mongomock-motor or pass --mongo-url")
+        mongo_client = AsyncMongoMockClient()
+        db_name = "estate_loadtest"
+        backend = "mongomock"
+    database = mongo_client[db_name]
+
+    counts = defaultdict(Counter)
+    original_db = server.db
+    server.db = CountingDatabase(database, counts)
+    try:
+        tokens = await seed(database, args.users, args.clients_per_user, args.appointments_per_user, rng)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as http:
+            if args.warmup:
+                await run_load(http, tokens, weights, args.warmup, args.concurrency, rng)
+                counts.clear()
+            latencies, statuses, wall = await run_load(http, tokens, weights, args.requests, args.concurrency, rng)
+    finally:
+        server.db = original_db
+        if args.mongo_url:
+            await mongo_client.drop_database(db_name)
+            mongo_client.close()
+
+    endpoints = {}
+    for name in weights:
+        samples = latencies.get(name, [])
+        ops = dict(sorted(counts.get(name, {}).items()))
+        endpoints[name] = {
+            "requests": len(samples),
+            "status_codes": {str(k): v for k, v in sorted(statuses[name].items())},
+            "throughput_rps": round(len(samples) / wall, 1) if wall else 0,
+            "latency": percentiles(samples),
+            "db_ops": ops,
+            "db_ops_per_request": round(sum(ops.values()) / len(samples), 2) if samples else 0,
+        }
+
+    return {
+        "benchmark": "load_test",
+        "python": platform.python_version(),
+        "backend": backend,
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "mix": weights,
+            "users": args.users,
+            "clients_per_user": args.clients_per_user,
+            "appointments_per_user": args.appointments_per_user,
+            "seed": args.seed,
+        },
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(args.requests / wall, 1) if wall else 0,
+        "latency": percentiles([s for samples in latencies.values() for s in samples]),
+        "endpoints": endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API in-process through an ASGI transport")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests issued first")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent in-flight requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights, e.g. {DEFAULT_MIX}")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--clients-per-user", type=int, default=15)
+    parser.add_argument("--appointments-per-user", type=int, default=40)
+    parser.add_argument("--mongo-url", help="use a local mongod instead of mongomock-motor")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Offline benchmark for the route optimizer.
+
+Generates synthetic days of appointments and times each phase of the
+columnar solver behind `optimize_route` (building columns, scoring, greedy
+construction, total distance) without a database or network. The previous
+dict-based optimizer is kept here as a baseline: every case reports its
+time, the speedup, and whether both produce the same visiting order.
+Results are printed as JSON so runs from different releases can be diffed.
+
+Usage (from the backend directory):
+    python benchmarks/bench_route_optimizer.py
+    python benchmarks/bench_route_optimizer.py --sizes 10,100,1000 --repeats 10 --output bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import routing  # noqa: E402
+import server  # noqa: E402
+
+# Rough metro area used for synthetic coordinates
+CENTER_LAT = 40.7128
+CENTER_LON = -74.0060
+SPREAD_DEG = 0.5
+CITIES = ["Springfield", "Riverside", "Fairview", "Franklin", "Greenville", "Madison", "Clinton", "Georgetown"]
+STREETS = ["Main St", "Oak Ave", "Pine Rd", "Maple Dr", "Cedar Ln", "Elm St", "Lake Blvd", "Hill Ct"]
+
+
+def generate_day(n: int, layout: str, missing_fraction: float, rng: random.Random) -> list:
+    """Build n appointment documents shaped like the `appointments` collection"""
+    centers = [
+        (CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG), CENTER_LON + rng.uniform(-SPREAD_DEG, SPREAD_DEG))
+        for _ in CITIES
+    ]
+    appointments = []
+    for i in range(n):
+        city_idx = rng.randrange(len(CITIES))
+        if layout == "clustered":
+            lat = rng.gauss(centers[city_idx][0], 0.02)
+            lon = rng.gauss(centers[city_idx][1], 0.02)
+        else:
+            lat = CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+            lon = CENTER_LON + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+        if rng.random() < missing_fraction:
+            lat = lon = None
+        start = rng.randrange(8 * 60, 18 * 60, 15)
+        duration = rng.choice([15, 30, 45, 60, 90, 120])
+        end = start + duration
+        appointments.append({
+            "id": f"appt-{i}",
+            "client_id": f"client-{rng.randrange(max(1, n // 3))}",
+            "property_address": f"{rng.randrange(1, 9999)} {rng.choice(STREETS)}",
+            "city": CITIES[city_idx],
+            "date": "2026-01-01",
+            "start_time": f"{start // 60:02d}:{start % 60:02d}",
+            "end_time": f"{min(end, 1439) // 60:02d}:{min(end, 1439) % 60:02d}",
+            "time_at_house": duration,
+            "is_open_house": rng.random() < 0.15,
+            "latitude": lat,
+            "longitude": lon,
+        })
+    return appointments
+
+
+def legacy_distance(appt1: dict, appt2: dict) -> float:
+    lat1, lon1 = appt1.get("latitude"), appt1.get("longitude")
+    lat2, lon2 = appt2.get("latitude"), appt2.get("longitude")
+    if lat1 and lon1 and lat2 and lon2:
+        return server.haversine_distance(lat1, lon1, lat2, lon2)
+    hash1 = sum(ord(c) for c in appt1.get("property_address", "")) % 100
+    hash2 = sum(ord(c) for c in appt2.get("property_address", "")) % 100
+    return abs(hash1 - hash2) * 0.1 + 1.0
+
+
+def legacy_route(appointments: list, priorities: dict) -> tuple:
+    """The dict-based optimizer the columnar solver replaced; returns (route, miles)"""
+    scored = []
+    for appt in appointments:
+        score = 0
+        if "open_house" in priorities and appt.get("is_open_house"):
+            score += priorities["open_house"]["weight"] * 100
+        if "appointment_time" in priorities:
+            score += priorities["appointment_time"]["weight"] * (1440 - server.time_to_minutes(appt.get("start_time", "12:00"))) / 14.4
+        if "time_at_house" in priorities:
+            score += priorities["time_at_house"]["weight"] * (120 - min(appt.get("time_at_house", 60), 120)) / 1.2
+        scored.append((score, appt))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    remaining = [a for _, a in scored]
+    route = []
+    if remaining:
+        current = remaining.pop(0)
+        route.append(current)
+        while remaining:
+            best_idx, best_score = 0, float("inf")
+            for i, appt in enumerate(remaining):
+                distance = legacy_distance(current, appt)
+                if "city_cluster" in priorities and current.get("city") == appt.get("city"):
+                    distance -= priorities["city_cluster"]["weight"]
+                if distance < best_score:
+                    best_score, best_idx = distance, i
+            current = remaining.pop(best_idx)
+            route.append(current)
+    return route, sum(legacy_distance(route[i], route[i + 1]) for i in range(len(route) - 1))
+
+
+def percentiles(samples: list) -> dict:
+    """p50/p90/p99/max of timing samples, in milliseconds"""
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        "p50_ms": round(pick(0.50), 4),
+        "p90_ms": round(pick(0.90), 4),
+        "p99_ms": round(pick(0.99), 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+    }
+
+
+def run_case(n: int, layout: str, missing_fraction: float, repeats: int, seed: int) -> dict:
+    """Time every optimizer phase for one synthetic day"""
+    rng = random.Random(f"{seed}-{n}-{layout}")
+    day = generate_day(n, layout, missing_fraction, rng)
+    settings = server.RoutePrioritySettings().model_dump()
+    priorities = {p["key"]: p for p in settings["priorities"] if p["enabled"]}
+
+    timings = {"columns": [], "score": [], "greedy": [], "distance": [], "total": [], "legacy_total": []}
+    tour_length = legacy_length = 0.0
+    order = legacy_order = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        columns = routing.RouteDay(day)
+        t1 = time.perf_counter()
+        ranked = routing.rank(columns, priorities)
+        t2 = time.perf_counter()
+        walk = routing.greedy_walk(columns, ranked, priorities)
+        t3 = time.perf_counter()
+        tour_length = routing.tour_length(columns, walk)
+        t4 = time.perf_counter()
+        legacy, legacy_length = legacy_route(day, priorities)
+        t5 = time.perf_counter()
+
+        timings["columns"].append(t1 - t0)
+        timings["score"].append(t2 - t1)
+        timings["greedy"].append(t3 - t2)
+        timings["distance"].append(t4 - t3)
+        timings["total"].append(t4 - t0)
+        timings["legacy_total"].append(t5 - t4)
+        order = [day[i]["id"] for i in walk.tolist()]
+        legacy_order = [a["id"] for a in legacy]
+
+    return {
+        "appointments": n,
+        "layout": layout,
+        "missing_fraction": missing_fraction,
+        "repeats": repeats,
+        "tour_length_miles": round(tour_length, 3),
+        "legacy_tour_length_miles": round(legacy_length, 3),
+        "matches_legacy": order == legacy_order,
+        "speedup": round(statistics.median(timings["legacy_total"]) / statistics.median(timings["total"]), 2),
+        "timings": {phase: percentiles(samples) for phase, samples in timings.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the route optimizer on synthetic days")
+    parser.add_argument("--sizes", default="10,50,100,250,500,1000,2000",
+                        help="comma-separated appointment counts per day")
+    parser.add_argument("--layouts", default="clustered,uniform", help="comma-separated coordinate layouts")
+    parser.add_argument("--missing", type=float, default=0.1, help="fraction of appointments without coordinates")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed, fixed for reproducible days")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    layouts = [layout for layout in args.layouts.split(",") if layout]
+    for layout in layouts:
+        if layout not in ("clustered", "uniform"):
+            parser.error(f"unknown layout: {layout}")
+
+    report = {
+        "benchmark": "route_optimizer",
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "cases": [
+            run_case(n, layout, args.missing, args.repeats, args.seed)
+            for layout in layouts
+            for n in sizes
+        ],
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
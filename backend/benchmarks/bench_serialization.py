@@ -0,0 +1,159 @@
+"""Offline benchmark for list-response serialization.
+
+Times turning 1000 MongoDB-shaped documents into a response body three ways:
+FastAPI's response_model path with the stdlib JSONResponse (how the list
+endpoints used to respond), the same with ORJSONResponse (how endpoints that
+return plain data respond now), and the validate-once TypeAdapter path the
+/clients, /appointments and /notes lists use. Also checks that all three
+bodies decode to the same JSON. No database or network is involved.
+
+Usage (from the backend directory):
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --items 1000 --repeats 50 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import server  # noqa: E402
+
+CITIES = ["Springfield", "Riverside", "Fairview", "Franklin", "Greenville"]
+
+
+def appointment_docs(n: int, rng: random.Random) -> list:
+    """Documents as the appointments collection returns them, including stored-only fields"""
+    docs = []
+    for _ in range(n):
+        start = rng.randrange(8 * 60, 17 * 60, 15)
+        lat, lon = 40.7 + rng.uniform(-0.3, 0.3), -74.0 + rng.uniform(-0.3, 0.3)
+        start_at = datetime(2026, 3, 2, tzinfo=timezone.utc) + timedelta(minutes=start)
+        now = datetime.now(timezone.utc).isoformat()
+        docs.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))), "user_id": "bench_user",
+            "client_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "property_address": f"{rng.randrange(1, 9999)} Oak Ave", "city": rng.choice(CITIES),
+            "date": "2026-03-02", "start_time": f"{start // 60:02d}:{start % 60:02d}",
+            "end_time": f"{(start + 45) // 60:02d}:{(start + 45) % 60:02d}", "time_at_house": 45,
+            "is_open_house": rng.random() < 0.2, "appointment_type": "private_viewing",
+            "house_status": "available", "latitude": lat, "longitude": lon,
+            "location": {"type": "Point", "coordinates": [lon, lat]},
+            "start_at": start_at, "end_at": start_at + timedelta(minutes=45),
+            "created_at": now, "updated_at": now, "version": rng.randrange(1, 5), "order_index": 0,
+        })
+    return docs
+
+
+def note_docs(n: int, rng: random.Random) -> list:
+    words = ["kitchen", "roof", "garden", "offer", "inspection", "garage", "follow", "client", "loved", "price"]
+    now = datetime.now(timezone.utc).isoformat()
+    return [{
+        "id": str(uuid.UUID(int=rng.getrandbits(128))), "user_id": "bench_user",
+        "appointment_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "property_address": f"{rng.randrange(1, 9999)} Pine Rd",
+        "notes": " ".join(rng.choice(words) for _ in range(rng.randrange(10, 80))),
+        "follow_up_required": rng.random() < 0.3, "created_at": now, "updated_at": now, "version": 1,
+    } for _ in range(n)]
+
+
+def percentiles(samples: list) -> dict:
+    """p50/p90/p99/max of timing samples, in milliseconds"""
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        "p50_ms": round(pick(0.50), 4),
+        "p90_ms": round(pick(0.90), 4),
+        "p99_ms": round(pick(0.99), 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+    }
+
+
+async def run_case(name: str, model, adapter, docs: list, repeats: int) -> dict:
+    field = create_response_field(name="response", type_=List[model])
+
+    async def response_model_path(response_class):
+        content = await serialize_response(field=field, response_content=docs)
+        return response_class(content).body
+
+    paths = {
+        "response_model_json": lambda: response_model_path(JSONResponse),
+        "response_model_orjson": lambda: response_model_path(ORJSONResponse),
+    }
+
+    async def type_adapter_path():
+        return server.list_response(adapter, docs).body
+
+    paths["type_adapter"] = type_adapter_path
+
+    timings = {path: [] for path in paths}
+    bodies = {}
+    for _ in range(repeats):
+        for path, run in paths.items():
+            started = time.perf_counter()
+            bodies[path] = await run()
+            timings[path].append(time.perf_counter() - started)
+
+    baseline = statistics.median(timings["response_model_json"])
+    decoded = [json.loads(body) for body in bodies.values()]
+    return {
+        "endpoint": name,
+        "items": len(docs),
+        "repeats": repeats,
+        "body_bytes": {path: len(body) for path, body in bodies.items()},
+        "outputs_match": all(d == decoded[0] for d in decoded),
+        "speedup_vs_response_model_json": {
+            path: round(baseline / statistics.median(samples), 2) for path, samples in timings.items()
+        },
+        "timings": {path: percentiles(samples) for path, samples in timings.items()},
+    }
+
+
+async def main_async(args) -> dict:
+    rng = random.Random(args.seed)
+    return {
+        "benchmark": "serialization",
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "cases": [
+            await run_case("/appointments", server.Appointment, server.APPOINTMENT_LIST,
+                           appointment_docs(args.items, rng), args.repeats),
+            await run_case("/notes", server.HouseNote, server.NOTE_LIST, note_docs(args.items, rng), args.repeats),
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark list-response serialization paths")
+    parser.add_argument("--items", type=int, default=1000, help="documents per response")
+    parser.add_argument("--repeats", type=int, default=30, help="timed runs per path")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    output = json.dumps(asyncio.run(main_async(args)), indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Response compression and HTTP caching headers.
+
+Both middlewares only rewrite responses sent as a single body. Streaming
+responses (export downloads, server-sent events) pass through untouched so
+nothing is buffered or delayed.
+
+`CacheHeadersMiddleware` gives per-user API GETs `Cache-Control: private,
+no-cache`, `Vary: Cookie, Authorization` and an ETag (a body hash when the
+endpoint did not set one), and answers a matching If-None-Match with 304.
+Browsers keep a copy but revalidate it on every use, so a change made from
+another tab or device shows up on the next request while unchanged
+responses cost only a 304.
+`CompressionMiddleware` compresses JSON and text bodies above a size
+threshold with brotli (when the optional `brotli` package is installed) or
+gzip, whichever the client prefers.
+"""
+import gzip
+import hashlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+COMPRESSIBLE_TYPES = {"application/json", "application/javascript", "application/xml", "image/svg+xml"}
+
+CACHE_POLICY = "private, no-cache"
+
+
+class _SingleBodyMiddleware:
+    """Hold back the response start until the body is known, then let `rewrite` edit both"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def applies(self, scope) -> bool:
+        return True
+
+    def rewrite(self, scope, start: dict, body: bytes):
+        return start, body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.applies(scope):
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal start, streaming
+            if streaming:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and message.get("more_body", False):
+                streaming = True
+                await send(start)
+                await send(message)
+            elif message["type"] == "http.response.body":
+                start = {**start, "headers": list(start.get("headers", []))}
+                start, body = self.rewrite(scope, start, message.get("body", b""))
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+            else:
+                await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires"""
+    if header.strip() == "*":
+        return True
+    return _opaque_tag(etag) in {_opaque_tag(tag) for tag in header.split(",")}
+
+
+class CacheHeadersMiddleware(_SingleBodyMiddleware):
+    def applies(self, scope) -> bool:
+        return scope["method"] in ("GET", "HEAD") and scope["path"].startswith("/api/")
+
+    def rewrite(self, scope, start: dict, body: bytes):
+        if start["status"] not in (200, 304):
+            return start, body
+        headers = MutableHeaders(raw=start["headers"])
+        if headers.get("content-type", "").startswith("text/event-stream"):
+            return start, body
+        if "cache-control" not in headers:
+            headers["cache-control"] = CACHE_POLICY
+        headers.add_vary_header("Cookie")
+        headers.add_vary_header("Authorization")
+        if start["status"] != 200:
+            return start, body
+
+        etag = headers.get("etag")
+        if etag is None:
+            etag = headers["etag"] = f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            for name in ("content-length", "content-type"):
+                if name in headers:
+                    del headers[name]
+            return {**start, "status": 304}, b""
+        return start, body
+
+
+def _accepted_encodings(scope) -> dict:
+    """Accept-Encoding codings with their q-values"""
+    accepted = {}
+    for part in Headers(scope=scope).get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+class CompressionMiddleware(_SingleBodyMiddleware):
+    def _encoding(self, scope):
+        accepted = _accepted_encodings(scope)
+        options = [name for name in (("br", "gzip") if brotli else ("gzip",)) if accepted.get(name, 0) > 0]
+        if not options:
+            return None
+        # Highest q wins; on a tie the listed order (brotli first) decides
+        return max(options, key=lambda name: accepted[name])
+
+    def applies(self, scope) -> bool:
+        return self._encoding(scope) is not None
+
+    def rewrite(self, scope, start: dict, body: bytes):
+        headers = MutableHeaders(raw=start["headers"])
+        content_type = headers.get("content-type", "").split(";")[0].strip()
+        compressible = (content_type in COMPRESSIBLE_TYPES or content_type.endswith("+json")
+                        or (content_type.startswith("text/") and content_type != "text/event-stream"))
+        if (len(body) < MIN_COMPRESS_BYTES or not compressible or "content-encoding" in headers
+                or start["status"] < 200 or start["status"] in (204, 304)):
+            return start, body
+
+        encoding = self._encoding(scope)
+        if encoding == "br":
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["content-encoding"] = encoding
+        headers["content-length"] = str(len(body))
+        headers.add_vary_header("Accept-Encoding")
+        # The compressed bytes are a different representation, so a strong tag must become weak
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["etag"] = f"W/{etag}"
+        return start, body
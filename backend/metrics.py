@@ -0,0 +1,338 @@
+"""In-process Prometheus-style metrics.
+
+A small registry of counters, gauges and histograms rendered in the
+Prometheus text exposition format, plus the collectors that feed it:
+an ASGI middleware for per-route HTTP metrics, PyMongo listeners for
+per-collection MongoDB metrics and connection pool waits, and an httpx
+transport for outbound calls. httpx itself is imported on the first outbound
+call, not at startup.
+"""
+import threading
+import time
+from typing import Dict, Iterable, Tuple
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        return []
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        lines = []
+        for key, state in items:
+            for bound, count in zip(self.buckets + (float("inf"),), state):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[len(self.buckets)]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests handled, by route template and status", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled", ("method", "route"))
+MONGO_COMMANDS = REGISTRY.counter(
+    "mongodb_commands_total", "MongoDB commands issued, by collection and outcome", ("collection", "command", "outcome"))
+MONGO_LATENCY = REGISTRY.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by collection", ("collection", "command"))
+MONGO_POOL_WAIT = REGISTRY.histogram(
+    "mongodb_pool_checkout_wait_seconds", "Time spent waiting to check a connection out of the pool", ("address",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+MONGO_POOL_CHECKOUTS = REGISTRY.counter(
+    "mongodb_pool_checkouts_total", "Connection checkouts, by outcome (ok, timeout, connectionError, poolClosed)",
+    ("address", "outcome"))
+MONGO_POOL_CONNECTIONS = REGISTRY.gauge(
+    "mongodb_pool_connections", "Open pool connections", ("address",))
+MONGO_POOL_IN_USE = REGISTRY.gauge(
+    "mongodb_pool_connections_in_use", "Pool connections currently checked out", ("address",))
+OUTBOUND_REQUESTS = REGISTRY.counter(
+    "http_client_requests_total", "Outbound HTTP requests, by target host and status", ("host", "status"))
+OUTBOUND_LATENCY = REGISTRY.histogram(
+    "http_client_request_duration_seconds", "Outbound HTTP request latency by target host", ("host",))
+
+
+class PrometheusMiddleware:
+    """Record count, latency and in-flight requests per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route_template(self, scope) -> str:
+        router = scope["app"].router
+        partial = None
+        for route in router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope)
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method, route=route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_LATENCY.observe(time.perf_counter() - started, method=method, route=route)
+            HTTP_REQUESTS.inc(method=method, route=route, status=status_holder["status"])
+            HTTP_IN_FLIGHT.dec(method=method, route=route)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Count MongoDB commands and time them per collection"""
+
+    # Connection handshake and auth chatter, not application queries
+    IGNORED = {"hello", "ismaster", "isMaster", "saslStart", "saslContinue", "endSessions", "ping"}
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in self.IGNORED:
+            return
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        collection = target if isinstance(target, str) else ""
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        MONGO_COMMANDS.inc(collection=collection, command=event.command_name, outcome=outcome)
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Pool size, connections in use and how long checkouts wait for a free connection"""
+
+    def __init__(self):
+        # PyMongo publishes a checkout's events on the thread doing the checkout
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _checkout_done(self, event, outcome: str):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            MONGO_POOL_WAIT.observe(time.perf_counter() - started, address=_address(event))
+            self._local.started = None
+        MONGO_POOL_CHECKOUTS.inc(address=_address(event), outcome=outcome)
+
+    def connection_checked_out(self, event):
+        self._checkout_done(event, "ok")
+        MONGO_POOL_IN_USE.inc(address=_address(event))
+
+    def connection_check_out_failed(self, event):
+        self._checkout_done(event, event.reason)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_IN_USE.dec(address=_address(event))
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.inc(address=_address(event))
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.dec(address=_address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+class MetricsTransport:
+    """httpx transport that times outbound requests per target host"""
+
+    def __init__(self, transport=None):
+        if transport is None:
+            import httpx
+
+            transport = httpx.AsyncHTTPTransport()
+        self._transport = transport
+
+    async def __aenter__(self):
+        await self._transport.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._transport.__aexit__(*exc_info)
+
+    async def handle_async_request(self, request):
+        host = request.url.host
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self._transport.handle_async_request(request)
+            status = response.status_code
+            return response
+        finally:
+            OUTBOUND_LATENCY.observe(time.perf_counter() - started, host=host)
+            OUTBOUND_REQUESTS.inc(host=host, status=status)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def http_client(**kwargs):
+    """httpx.AsyncClient whose requests are recorded by MetricsTransport"""
+    import httpx
+
+    return httpx.AsyncClient(transport=MetricsTransport(), **kwargs)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,142 @@
+"""Reminder and daily-summary delivery.
+
+`TimerHeap` orders pending notifications by due time for the scheduler loop
+in server.py, and sinks deliver batches of rendered messages. The sink is
+picked with NOTIFICATION_SINK: `log` (default) writes each message to the
+application log, `smtp` sends through SMTP_HOST:SMTP_PORT, which can be a
+local debugging server such as `python -m aiosmtpd -n -l localhost:1025`.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import smtplib
+from datetime import datetime
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Notification:
+    __slots__ = ("key", "due", "kind", "user_id", "payload", "attempts")
+
+    def __init__(self, key: str, due: datetime, kind: str, user_id: str, payload: dict):
+        self.key = key
+        self.due = due
+        self.kind = kind
+        self.user_id = user_id
+        self.payload = payload
+        self.attempts = 0
+
+
+class Message:
+    __slots__ = ("key", "to", "subject", "body")
+
+    def __init__(self, key: str, to: str, subject: str, body: str):
+        self.key = key
+        self.to = to
+        self.subject = subject
+        self.body = body
+
+
+class TimerHeap:
+    """Min-heap of notifications by due time.
+
+    Keys stay known after their timer fires, so a rescan that finds the same
+    reminder again does not re-arm it; `prune` forgets keys long past due.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._keys: Dict[str, datetime] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, notification: Notification, rearm: bool = False) -> bool:
+        if notification.key in self._keys and not rearm:
+            return False
+        self._keys[notification.key] = notification.due
+        heapq.heappush(self._heap, (notification.due, next(self._counter), notification))
+        return True
+
+    def next_due(self) -> Optional[datetime]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime, limit: int) -> List[Notification]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < limit:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def prune(self, before: datetime):
+        pending = {entry[2].key for entry in self._heap}
+        self._keys = {key: due for key, due in self._keys.items() if due >= before or key in pending}
+
+    def clear(self):
+        self._heap.clear()
+        self._keys.clear()
+
+
+class LogSink:
+    """Write messages to the log instead of sending them"""
+
+    async def send(self, messages: List[Message]) -> List[str]:
+        for message in messages:
+            logger.info(f"Notification to {message.to}: {message.subject}\n{message.body}")
+        return []
+
+
+class SmtpSink:
+    """Send a batch over one SMTP connection; returns the keys that failed"""
+
+    def __init__(self, host: str, port: int, sender: str, username: str = "", password: str = "",
+                 starttls: bool = False):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+
+    def _send_all(self, messages: List[Message]) -> List[str]:
+        failed = []
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = self.sender
+                email["To"] = message.to
+                email["Subject"] = message.subject
+                email.set_content(message.body)
+                try:
+                    smtp.send_message(email)
+                except smtplib.SMTPException as e:
+                    logger.error(f"SMTP delivery to {message.to} failed: {e}")
+                    failed.append(message.key)
+        return failed
+
+    async def send(self, messages: List[Message]) -> List[str]:
+        return await asyncio.to_thread(self._send_all, messages)
+
+
+def sink_from_env():
+    kind = os.environ.get("NOTIFICATION_SINK", "log")
+    if kind == "smtp":
+        return SmtpSink(
+            host=os.environ.get("SMTP_HOST", "localhost"),
+            port=int(os.environ.get("SMTP_PORT", "1025")),
+            sender=os.environ.get("SMTP_FROM", "Estate Scheduler <noreply@localhost>"),
+            username=os.environ.get("SMTP_USERNAME", ""),
+            password=os.environ.get("SMTP_PASSWORD", ""),
+            starttls=os.environ.get("SMTP_STARTTLS", "") == "1",
+        )
+    if kind != "log":
+        logger.warning(f"Unknown NOTIFICATION_SINK {kind!r}; logging notifications instead")
+    return LogSink()
@@ -0,0 +1,201 @@
+"""Opt-in per-request profiling.
+
+Requests are profiled with cProfile when they carry an `X-Profile` header
+matching PROFILE_TOKEN, or when picked by PROFILE_SAMPLE_RATE. Each profile
+breaks wall time down into MongoDB command time (from a PyMongo command
+listener), Pydantic validation/serialization time, remaining CPU time on
+the event-loop thread (measured with `time.thread_time`, so time the loop
+spends idle in its selector is not counted) and other waiting, and keeps the
+hottest functions. Profiles slower than
+PROFILE_SLOW_MS are kept in a fixed-size ring buffer for the admin endpoints.
+
+cProfile hooks the whole event-loop thread, so only one request is profiled
+at a time; work from other requests interleaved on the loop is included.
+"""
+import contextvars
+import cProfile
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import monitoring
+
+PROFILE_HEADER = b"x-profile"
+TOP_FUNCTIONS = 25
+
+_current = contextvars.ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.status = None
+        self.wall_s = 0.0
+        self.mongo_s = 0.0
+        self.mongo_commands = 0
+        self.pydantic_s = 0.0
+        self.cpu_s = 0.0
+        self.functions = []
+        self._lock = threading.Lock()
+
+    def add_mongo(self, seconds: float):
+        # Called from Motor's executor threads
+        with self._lock:
+            self.mongo_s += seconds
+            self.mongo_commands += 1
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "reason": self.reason,
+            "started_at": self.started_at,
+            "wall_ms": round(self.wall_s * 1000, 3),
+            "breakdown_ms": {
+                "mongo": round(self.mongo_s * 1000, 3),
+                "pydantic": round(self.pydantic_s * 1000, 3),
+                "cpu": round(self.cpu_s * 1000, 3),
+                "other": round(max(0.0, self.wall_s - self.mongo_s - self.pydantic_s - self.cpu_s) * 1000, 3),
+            },
+            "mongo_commands": self.mongo_commands,
+        }
+
+    def detail(self) -> dict:
+        return {**self.summary(), "functions": self.functions}
+
+
+class ProfileStore:
+    """Ring buffer of the most recent slow request profiles"""
+
+    def __init__(self, size: int):
+        self._profiles = deque(maxlen=size)
+
+    def add(self, profile: RequestProfile):
+        self._profiles.append(profile)
+
+    def list(self) -> list:
+        return [p.summary() for p in sorted(self._profiles, key=lambda p: p.wall_s, reverse=True)]
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        for profile in self._profiles:
+            if profile.id == profile_id:
+                return profile.detail()
+        return None
+
+
+PROFILES = ProfileStore(int(os.environ.get("PROFILE_BUFFER_SIZE", "50")))
+
+
+class MongoProfileListener(monitoring.CommandListener):
+    """Attribute MongoDB command time to the request being profiled"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        profile = _current.get()
+        if profile is not None:
+            profile.add_mongo(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+def _is_pydantic(key) -> bool:
+    filename, _, name = key
+    return "pydantic" in filename or "pydantic_core" in name
+
+
+def _is_idle(key) -> bool:
+    """The event loop blocked in its selector (epoll/kqueue/select), waiting for I/O"""
+    filename, _, name = key
+    return filename == "~" and "select." in name
+
+
+def _analyse(profile: RequestProfile, profiler: cProfile.Profile, thread_cpu_s: float):
+    stats = {key: value for key, value in pstats.Stats(profiler).stats.items() if not _is_idle(key)}
+    pydantic = sum(tottime for key, (_, _, tottime, _, _) in stats.items() if _is_pydantic(key))
+    profile.pydantic_s = pydantic
+    profile.cpu_s = max(0.0, thread_cpu_s - pydantic)
+
+    hottest = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+    profile.functions = [
+        {
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3),
+        }
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in hottest
+    ]
+
+
+class ProfilingMiddleware:
+    """Wrap selected requests in cProfile and keep the slow ones"""
+
+    def __init__(self, app):
+        self.app = app
+        self.token = os.environ.get("PROFILE_TOKEN", "")
+        self.sample_rate = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+        self.slow_s = float(os.environ.get("PROFILE_SLOW_MS", "500")) / 1000
+        self._active = False
+
+    def _reason(self, scope) -> Optional[str]:
+        if self.token:
+            for name, value in scope.get("headers", []):
+                if name == PROFILE_HEADER and value.decode("latin-1") == self.token:
+                    return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        reason = self._reason(scope) if scope["type"] == "http" and not self._active else None
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], reason)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                if reason == "header":
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (debugger, coverage) already owns the hook
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        token = _current.set(profile)
+        started = time.perf_counter()
+        cpu_started = time.thread_time()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            thread_cpu_s = time.thread_time() - cpu_started
+            profile.wall_s = time.perf_counter() - started
+            _current.reset(token)
+            self._active = False
+            _analyse(profile, profiler, thread_cpu_s)
+            if reason == "header" or profile.wall_s >= self.slow_s:
+                PROFILES.add(profile)
@@ -0,0 +1,193 @@
+"""Schedule validation and free-slot search over one day of appointments.
+
+Appointments are turned into intervals of minutes since midnight and held in
+a static interval tree, so checking a candidate booking costs O(log n + k)
+rather than a scan of the day. Besides direct overlaps, a booking conflicts
+with its previous and next stops when the gap between them is shorter than
+the estimated drive; the same rule shrinks the gaps offered as free slots.
+Travel estimates are supplied by the caller, which keeps this module free of
+database and geocoding concerns.
+"""
+from bisect import bisect_left, bisect_right
+from typing import Callable, List, Optional
+
+# (from item, to item) -> minutes of travel, or None when it cannot be estimated
+TravelEstimate = Callable[[dict, dict], Optional[int]]
+
+
+class Interval:
+    __slots__ = ("start", "end", "item")
+
+    def __init__(self, start: int, end: int, item: dict):
+        self.start = start
+        self.end = end
+        self.item = item
+
+
+class Conflict:
+    __slots__ = ("kind", "interval", "other", "overlap_minutes", "travel_minutes", "gap_minutes")
+
+    def __init__(self, kind: str, interval: Interval, other: Interval,
+                 overlap_minutes: int = 0, travel_minutes: int = 0, gap_minutes: int = 0):
+        self.kind = kind
+        self.interval = interval
+        self.other = other
+        self.overlap_minutes = overlap_minutes
+        self.travel_minutes = travel_minutes
+        self.gap_minutes = gap_minutes
+
+
+class IntervalTree:
+    """Static augmented interval tree.
+
+    Intervals are kept sorted by start; the implicit tree takes the middle of
+    each slice as its node, and `_max_end[i]` is the latest end in the subtree
+    rooted at i, which lets a search skip subtrees that finish too early.
+    """
+
+    def __init__(self, intervals: List[Interval]):
+        self._items = sorted(intervals, key=lambda i: (i.start, i.end))
+        self._starts = [i.start for i in self._items]
+        self._by_end = sorted(self._items, key=lambda i: (i.end, i.start))
+        self._ends = [i.end for i in self._by_end]
+        self._max_end = [0] * len(self._items)
+        self._build(0, len(self._items) - 1)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def _build(self, lo: int, hi: int) -> float:
+        if lo > hi:
+            return float("-inf")
+        mid = (lo + hi) // 2
+        latest = max(self._items[mid].end, self._build(lo, mid - 1), self._build(mid + 1, hi))
+        self._max_end[mid] = latest
+        return latest
+
+    def overlapping(self, start: int, end: int) -> List[Interval]:
+        """Intervals sharing at least a minute with [start, end)"""
+        found = []
+        self._search(0, len(self._items) - 1, start, end, found)
+        return found
+
+    def _search(self, lo: int, hi: int, start: int, end: int, found: list):
+        if lo > hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] <= start:
+            return
+        self._search(lo, mid - 1, start, end, found)
+        item = self._items[mid]
+        if item.start < end:
+            if item.end > start:
+                found.append(item)
+            self._search(mid + 1, hi, start, end, found)
+
+    def previous(self, start: int) -> Optional[Interval]:
+        """The interval finishing last at or before `start`"""
+        index = bisect_right(self._ends, start) - 1
+        return self._by_end[index] if index >= 0 else None
+
+    def next(self, end: int) -> Optional[Interval]:
+        """The interval starting first at or after `end`"""
+        index = bisect_left(self._starts, end)
+        return self._items[index] if index < len(self._items) else None
+
+
+def _travel_conflict(before: Interval, after: Interval, travel: TravelEstimate, subject: Interval) -> Optional[Conflict]:
+    needed = travel(before.item, after.item)
+    gap = after.start - before.end
+    if needed is None or needed <= gap:
+        return None
+    other = after if subject is before else before
+    return Conflict("travel", subject, other, travel_minutes=needed, gap_minutes=gap)
+
+
+def find_conflicts(tree: IntervalTree, candidate: Interval, travel: TravelEstimate) -> List[Conflict]:
+    """Overlaps with `candidate`, and travel gaps to its previous and next stops"""
+    conflicts = [
+        Conflict("overlap", candidate, other,
+                 overlap_minutes=min(candidate.end, other.end) - max(candidate.start, other.start))
+        for other in tree.overlapping(candidate.start, candidate.end)
+    ]
+    before = tree.previous(candidate.start)
+    if before is not None:
+        conflict = _travel_conflict(before, candidate, travel, candidate)
+        if conflict:
+            conflicts.append(conflict)
+    after = tree.next(candidate.end)
+    if after is not None:
+        conflict = _travel_conflict(candidate, after, travel, candidate)
+        if conflict:
+            conflicts.append(conflict)
+    return conflicts
+
+
+def day_conflicts(tree: IntervalTree, travel: TravelEstimate) -> List[Conflict]:
+    """Every conflict in the day, each overlapping pair and travel leg reported once"""
+    conflicts = []
+    for interval in tree:
+        for other in tree.overlapping(interval.start, interval.end):
+            if (other.start, other.end, id(other)) > (interval.start, interval.end, id(interval)):
+                conflicts.append(Conflict(
+                    "overlap", interval, other,
+                    overlap_minutes=min(interval.end, other.end) - max(interval.start, other.start)))
+        after = tree.next(interval.end)
+        if after is not None and after is not interval:
+            conflict = _travel_conflict(interval, after, travel, interval)
+            if conflict:
+                conflicts.append(conflict)
+    return conflicts
+
+
+class Slot:
+    __slots__ = ("start", "end", "window_start", "window_end", "travel_before", "travel_after")
+
+    def __init__(self, start: int, end: int, window_start: int, window_end: int,
+                 travel_before: Optional[int], travel_after: Optional[int]):
+        self.start = start
+        self.end = end
+        self.window_start = window_start
+        self.window_end = window_end
+        self.travel_before = travel_before
+        self.travel_after = travel_after
+
+
+def free_slots(intervals: List[Interval], day_start: int, day_end: int, duration: int,
+               candidate: dict, travel: TravelEstimate, step: int = 15) -> List[Slot]:
+    """Bookable slots of `duration` minutes for `candidate` within working hours.
+
+    One sweep over the day's intervals in start order tracks the end of the
+    busy time so far and the stop that ended it. Each gap is shrunk by the
+    drive from that stop and the drive on to the next one, and the earliest
+    start on a `step` boundary is proposed. Unknown travel counts as zero.
+    """
+    slots = []
+    cursor, previous = day_start, None
+
+    def close_gap(gap_end: int, following: Optional[Interval]):
+        before = travel(previous.item, candidate) if previous is not None else None
+        after = travel(candidate, following.item) if following is not None else None
+        earliest = cursor + (before or 0)
+        earliest += -earliest % step
+        latest = gap_end - (after or 0)
+        if earliest + duration <= latest:
+            slots.append(Slot(earliest, earliest + duration, cursor, gap_end, before, after))
+
+    for interval in sorted(intervals, key=lambda i: (i.start, i.end)):
+        if interval.end <= day_start:
+            continue
+        if interval.start >= day_end:
+            close_gap(day_end, interval)
+            break
+        if interval.start > cursor:
+            close_gap(interval.start, interval)
+        if interval.end >= cursor:
+            cursor, previous = interval.end, interval
+    else:
+        if cursor < day_end:
+            close_gap(day_end, None)
+    return slots
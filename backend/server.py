@@ -1,17 +1,42 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends, Query, Header
+from fastapi.responses import ORJSONResponse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import socket
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, field_validator
+from typing import Dict, List, Optional, Set
 import uuid
 from datetime import datetime, timezone, timedelta
 from enum import Enum
-import httpx
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import math
+import json
+import codecs
+import csv
+import re
+import asyncio
+import io
+import zlib
+import base64
+import hashlib
+from starlette.responses import StreamingResponse
+from pydantic import ValidationError
+from pymongo import InsertOne, UpdateOne, DeleteOne, DeleteMany, ReadPreference, ReturnDocument
+from pymongo.errors import (BulkWriteError, DuplicateKeyError, ExecutionTimeout, NetworkTimeout, OperationFailure,
+                            ServerSelectionTimeoutError, WaitQueueTimeoutError)
+
+from http_cache import CacheHeadersMiddleware, CompressionMiddleware
+from metrics import MongoCommandMetrics, MongoPoolMetrics, PrometheusMiddleware
+from profiling import MongoProfileListener, ProfilingMiddleware, PROFILES
+from settings_cache import MongoInvalidationBus, RedisInvalidationBus, UserDocCache
+import metrics
+import scheduling
+from notifications import Message, Notification, TimerHeap, sink_from_env
 
 ROOT_DIR = Path(__file__).parent
 # Load .env only if environment variables are not already set (production sets them)
@@ -20,10 +45,50 @@ load_dotenv(ROOT_DIR / '.env', override=False)
 # MongoDB connection - use environment variable (set by platform in production)
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 db_name = os.environ.get('DB_NAME', 'estate_scheduler')
-client = AsyncIOMotorClient(mongo_url)
-db = client[db_name]
+# Pool sizes are per worker process: N workers open up to N * MONGO_MAX_POOL_SIZE connections
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+# Bounds on every wait so a slow or unreachable member fails requests instead of stalling them
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+# Server-side time limit (maxTimeMS) for the read-heavy list and dashboard queries
+MONGO_MAX_TIME_MS = int(os.environ.get('MONGO_MAX_TIME_MS', '5000'))
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+# Lists and dashboard counts read from the primary unless a deployment opts into secondaries
+# (e.g. secondaryPreferred); the UI refetches right after writes, so lagging reads can hide new rows
+LIST_READ_PREFERENCE = READ_PREFERENCES[os.environ.get('MONGO_LIST_READ_PREFERENCE', 'primary')]
+# Created by connect_db() in the lifespan, so every worker process opens its own pool after any fork
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+def mongo_client_options() -> dict:
+    return {
+        # BSON datetimes (appointment start_at/end_at) come back as UTC-aware values
+        "tz_aware": True,
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "event_listeners": [MongoCommandMetrics(), MongoPoolMetrics(), MongoProfileListener()],
+    }
+
+async def connect_db():
+    """Open this process's MongoDB client; a database installed beforehand (tests, benchmarks) is kept"""
+    global client, db
+    if db is None:
+        client = AsyncIOMotorClient(mongo_url, **mongo_client_options())
+        db = client[db_name]
 
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 # === AUTH MODELS ===
@@ -88,7 +153,8 @@ async def create_guest_session(response: Response):
         "is_guest": True,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.users.insert_one(user_doc)
+    # insert_one adds _id to the document it is given, so keep user_doc clean for the response
+    await db.users.insert_one(dict(user_doc))
     
     # Create session
     expires_at = datetime.now(timezone.utc) + timedelta(days=30)
@@ -111,8 +177,7 @@ async def create_guest_session(response: Response):
         max_age=30 * 24 * 60 * 60
     )
     
-    user = await db.users.find_one({"user_id": guest_id}, {"_id": 0})
-    return {"user": user, "session_token": session_token}
+    return {"user": user_doc, "session_token": session_token}
 
 # === AUTH ENDPOINTS ===
 @api_router.post("/auth/session")
@@ -125,7 +190,7 @@ async def create_session(request: Request, response: Response):
         raise HTTPException(status_code=400, detail="session_id required")
     
     # Get user data from Emergent Auth
-    async with httpx.AsyncClient() as client_http:
+    async with metrics.http_client() as client_http:
         auth_response = await client_http.get(
             "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
             headers={"X-Session-ID": session_id}
@@ -141,27 +206,21 @@ async def create_session(request: Request, response: Response):
     picture = auth_data.get("picture")
     session_token = auth_data.get("session_token")
     
-    # Check if user exists
-    existing_user = await db.users.find_one({"email": email}, {"_id": 0})
-    
-    if existing_user:
-        user_id = existing_user["user_id"]
-        # Update user info
-        await db.users.update_one(
-            {"email": email},
-            {"$set": {"name": name, "picture": picture}}
-        )
-    else:
-        # Create new user
-        user_id = f"user_{uuid.uuid4().hex[:12]}"
-        user_doc = {
-            "user_id": user_id,
-            "email": email,
-            "name": name,
-            "picture": picture,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.users.insert_one(user_doc)
+    # Update the existing user's info, or create the user, in one round trip
+    user = await db.users.find_one_and_update(
+        {"email": email},
+        {
+            "$set": {"name": name, "picture": picture},
+            "$setOnInsert": {
+                "user_id": f"user_{uuid.uuid4().hex[:12]}",
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }
+        },
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    user_id = user["user_id"]
     
     # Create session
     expires_at = datetime.now(timezone.utc) + timedelta(days=7)
@@ -172,9 +231,11 @@ async def create_session(request: Request, response: Response):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    # Remove old sessions for this user
-    await db.user_sessions.delete_many({"user_id": user_id})
-    await db.user_sessions.insert_one(session_doc)
+    # Remove old sessions for this user and store the new one in a single ordered batch
+    await db.user_sessions.bulk_write([
+        DeleteMany({"user_id": user_id}),
+        InsertOne(session_doc)
+    ], ordered=True)
     
     # Set cookie
     response.set_cookie(
@@ -187,7 +248,6 @@ async def create_session(request: Request, response: Response):
         max_age=7 * 24 * 60 * 60
     )
     
-    user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
     # Return session_token in response for localStorage fallback
     return {"user": user, "session_token": session_token}
 
@@ -225,11 +285,36 @@ class UserSettings(BaseModel):
     workEndTime: str = "18:00"
     workDays: List[str] = Field(default_factory=lambda: ["mon", "tue", "wed", "thu", "fri"])
     theme: str = "light"
+    # IANA zone that appointment times and the daily summary time are read in; None uses DEFAULT_TIMEZONE
+    timezone: Optional[str] = None
+
+    @field_validator("timezone")
+    @classmethod
+    def known_timezone(cls, value: Optional[str]) -> Optional[str]:
+        if value:
+            try:
+                ZoneInfo(value)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError(f"Unknown time zone {value!r}")
+        return value or None
+
+# === USER DOCUMENT CACHE ===
+# Settings and priorities are read on hot paths and almost never written
+USER_CACHE = UserDocCache(ttl_seconds=int(os.environ.get("USER_CACHE_TTL_SECONDS", "300")))
+REDIS_URL = os.environ.get("REDIS_URL", "")
+
+async def cached_user_settings(user_id: str) -> Optional[dict]:
+    return await USER_CACHE.get(
+        "user_settings", user_id, lambda: db.user_settings.find_one({"user_id": user_id}, {"_id": 0}))
+
+async def cached_route_priorities(user_id: str) -> Optional[dict]:
+    return await USER_CACHE.get(
+        "route_priorities", user_id, lambda: db.route_priorities.find_one({"user_id": user_id}, {"_id": 0}))
 
 # === USER SETTINGS ENDPOINTS ===
 @api_router.get("/user-settings")
 async def get_user_settings(user: User = Depends(get_current_user)):
-    settings = await db.user_settings.find_one({"user_id": user.user_id}, {"_id": 0})
+    settings = await cached_user_settings(user.user_id)
     if not settings:
         return UserSettings(user_id=user.user_id)
     return settings
@@ -238,11 +323,13 @@ async def get_user_settings(user: User = Depends(get_current_user)):
 async def update_user_settings(settings: UserSettings, user: User = Depends(get_current_user)):
     settings.user_id = user.user_id
     doc = settings.model_dump()
+    doc["updated_at"] = datetime.now(timezone.utc).isoformat()
     await db.user_settings.update_one(
         {"user_id": user.user_id},
         {"$set": doc},
         upsert=True
     )
+    await USER_CACHE.write("user_settings", user.user_id, doc)
     return settings
 
 # === ENUMS ===
@@ -269,6 +356,8 @@ class ClientBase(BaseModel):
     phone_type: PhoneType
     email: str
     current_address: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 class ClientCreate(ClientBase):
     pass
@@ -278,6 +367,8 @@ class Client(ClientBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str = ""
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    version: int = 1
 
 # === APPOINTMENT MODELS ===
 class AppointmentBase(BaseModel):
@@ -302,7 +393,12 @@ class Appointment(AppointmentBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str = ""
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    version: int = 1
     order_index: int = 0
+    # Derived from date/start_time/end_time for indexed range queries (wall-clock, stored as UTC)
+    start_at: Optional[datetime] = None
+    end_at: Optional[datetime] = None
 
 # === HOUSE NOTES MODELS ===
 class HouseNoteBase(BaseModel):
@@ -320,6 +416,7 @@ class HouseNote(HouseNoteBase):
     user_id: str = ""
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
     updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    version: int = 1
 
 # === ROUTE PRIORITY MODELS ===
 class PriorityItem(BaseModel):
@@ -340,147 +437,1627 @@ class RoutePrioritySettings(BaseModel):
         PriorityItem(key="city_cluster", label="Same City Cluster", weight=1, enabled=True),
     ])
 
+class AppointmentNear(Appointment):
+    distance_miles: float
+
+class ClientNear(Client):
+    distance_miles: float
+
 class OptimizedRoute(BaseModel):
     appointments: List[Appointment]
     total_estimated_time: int
     total_distance_estimate: float
     finish_time_estimate: str
 
+# === BULK MODELS ===
+class BulkOp(str, Enum):
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+class BulkItemResult(BaseModel):
+    index: int
+    op: Optional[str] = None
+    status: str
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkResult(BaseModel):
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    failed: int = 0
+    results: List[BulkItemResult] = Field(default_factory=list)
+
+# === SCHEDULING MODELS ===
+class ScheduleConflict(BaseModel):
+    kind: str  # "overlap" or "travel"
+    appointment_id: str
+    conflicts_with: str
+    overlap_minutes: int = 0
+    travel_minutes: int = 0
+    gap_minutes: int = 0
+
+class AppointmentWrite(Appointment):
+    """A saved appointment and the schedule conflicts it was saved with"""
+    conflicts: List[ScheduleConflict] = Field(default_factory=list)
+
+class ConflictReport(BaseModel):
+    date: str
+    conflicts: List[ScheduleConflict]
+
+class AvailabilitySlot(BaseModel):
+    date: str
+    start_time: str
+    end_time: str
+    # Free time around the slot, between the surrounding stops or working hours
+    window_start: str
+    window_end: str
+    travel_minutes_before: Optional[int] = None
+    travel_minutes_after: Optional[int] = None
+
+# === SEARCH MODELS ===
+class SearchType(str, Enum):
+    CLIENT = "client"
+    APPOINTMENT = "appointment"
+    NOTE = "note"
+
+class SearchSnippet(BaseModel):
+    field: str
+    text: str
+    # [start, end) character offsets of matched terms within `text`
+    highlights: List[List[int]] = Field(default_factory=list)
+
+class SearchHit(BaseModel):
+    type: SearchType
+    id: str
+    score: float
+    title: str
+    snippet: Optional[SearchSnippet] = None
+    document: dict
+
+class SearchResult(BaseModel):
+    query: str
+    total: int
+    facets: Dict[str, int]
+    offset: int
+    limit: int
+    hits: List[SearchHit]
+
+# === GEO HELPERS ===
+METERS_PER_MILE = 1609.344
+
+def geo_point(latitude: Optional[float], longitude: Optional[float]) -> Optional[dict]:
+    """Build a GeoJSON point (lon, lat order) or None when coordinates are missing"""
+    if latitude is None or longitude is None:
+        return None
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+def with_location(doc: dict) -> dict:
+    """Attach the indexed `location` point derived from latitude/longitude"""
+    point = geo_point(doc.get("latitude"), doc.get("longitude"))
+    if point:
+        doc["location"] = point
+    return doc
+
+def geo_update(update_data: dict) -> dict:
+    """Build an update document that keeps `location` in sync with latitude/longitude"""
+    point = geo_point(update_data.get("latitude"), update_data.get("longitude"))
+    if point:
+        return {"$set": {**update_data, "location": point}}
+    return {"$set": update_data, "$unset": {"location": ""}}
+
+def date_range_filter(field: str, date: Optional[str], date_from: Optional[str], date_to: Optional[str]) -> dict:
+    """Filter on a YYYY-MM-DD (or ISO timestamp) string field; bounds are inclusive days"""
+    if date:
+        return {field: {"$gte": date, "$lte": f"{date}\uffff"}}
+    condition = {}
+    if date_from:
+        condition["$gte"] = date_from
+    if date_to:
+        condition["$lte"] = f"{date_to}\uffff"
+    return {field: condition} if condition else {}
+
+def schedule_bounds(date: str, start_time: str, end_time: str) -> tuple:
+    """(start_at, end_at) datetimes for an appointment; end rolls past midnight if needed"""
+    try:
+        start_at = datetime.strptime(f"{date}T{start_time}", "%Y-%m-%dT%H:%M").replace(tzinfo=timezone.utc)
+        end_at = datetime.strptime(f"{date}T{end_time}", "%Y-%m-%dT%H:%M").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None, None
+    if end_at < start_at:
+        end_at += timedelta(days=1)
+    return start_at, end_at
+
+def with_schedule(data: dict) -> dict:
+    """Set start_at/end_at on appointment data; documents without a date pass through"""
+    if "date" in data:
+        data["start_at"], data["end_at"] = schedule_bounds(data["date"], data.get("start_time"), data.get("end_time"))
+    return data
+
+def parse_range_bound(value: str, end: bool) -> datetime:
+    """Parse a from/to bound; a bare date as `to` includes that whole day"""
+    try:
+        if len(value) == 10:
+            bound = datetime.strptime(value, "%Y-%m-%d")
+            if end:
+                bound += timedelta(days=1)
+        else:
+            bound = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date or datetime: {value}")
+    if bound.tzinfo is None:
+        bound = bound.replace(tzinfo=timezone.utc)
+    return bound.astimezone(timezone.utc)
+
+async def geo_near(collection, latitude: float, longitude: float, radius_miles: float, query: dict, limit: int) -> list:
+    """Run $geoNear over the 2dsphere `location` index, nearest first, distances in miles"""
+    pipeline = [
+        {"$geoNear": {
+            "near": geo_point(latitude, longitude),
+            "key": "location",
+            "distanceField": "distance_miles",
+            "distanceMultiplier": 1 / METERS_PER_MILE,
+            "maxDistance": radius_miles * METERS_PER_MILE,
+            "spherical": True,
+            "query": query,
+        }},
+        {"$limit": limit},
+        {"$project": {"_id": 0, "location": 0}},
+    ]
+    return await collection.aggregate(pipeline).to_list(limit)
+
+# === CONDITIONAL REQUEST HELPERS ===
+# Documents carry a `version` counter bumped on every write; its ETag is "v<version>"
+VERSION_ETAG = re.compile(r'^"v(\d+)"$')
+
+def versioned(update: dict) -> dict:
+    """Add the version bump and updated_at stamp every document write must carry"""
+    update = dict(update)
+    update["$set"] = {**update.get("$set", {}), "updated_at": datetime.now(timezone.utc).isoformat()}
+    update["$inc"] = {**update.get("$inc", {}), "version": 1}
+    return update
+
+def version_etag(doc: dict) -> str:
+    return f'"v{doc.get("version", 1)}"'
+
+def parse_etags(header: str) -> List[str]:
+    """Entity tags from an If-Match/If-None-Match header, weak prefixes dropped"""
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.append(tag)
+    return tags
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return parse_etags(etag)[0] in parse_etags(header)
+
+def if_match_filter(query: dict, if_match: Optional[str]) -> dict:
+    """Narrow a write filter to the versions listed in If-Match"""
+    if not if_match or if_match.strip() == "*":
+        return query
+    versions = []
+    for tag in parse_etags(if_match):
+        match = VERSION_ETAG.match(tag)
+        if match:
+            versions.append(int(match.group(1)))
+    # No usable versions leaves an empty $in, so the write can only fail with 412
+    return {**query, "version": {"$in": versions}}
+
+async def raise_write_miss(collection, query: dict, if_match: Optional[str], detail: str):
+    """A write matched nothing: 412 if the document exists but If-Match failed, else 404"""
+    if if_match and await collection.count_documents(query, limit=1):
+        raise HTTPException(status_code=412, detail="Precondition failed: resource was modified")
+    raise HTTPException(status_code=404, detail=detail)
+
+def summary_etag(count: int, versions: int, updated) -> str:
+    digest = hashlib.sha1(f'{count}:{versions}:{updated}'.encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+async def list_etag(collection, query: dict) -> str:
+    """Weak ETag for a list query from its count, version total and latest update"""
+    summary = await collection.aggregate([
+        {"$match": query},
+        {"$group": {"_id": None, "n": {"$sum": 1}, "v": {"$sum": "$version"}, "u": {"$max": "$updated_at"}}},
+    ], maxTimeMS=MONGO_MAX_TIME_MS).to_list(1)
+    state = summary[0] if summary else {}
+    return summary_etag(state.get("n", 0), state.get("v", 0), state.get("u", ""))
+
+def docs_etag(docs: list) -> str:
+    """The list_etag of exactly these documents"""
+    if not docs:
+        return summary_etag(0, 0, "")
+    updated = [doc["updated_at"] for doc in docs if doc.get("updated_at") is not None]
+    return summary_etag(len(docs), sum(doc.get("version") or 0 for doc in docs), max(updated) if updated else None)
+
+def list_reads(collection):
+    """`collection` with the read preference of the list and dashboard queries"""
+    if LIST_READ_PREFERENCE == ReadPreference.PRIMARY:
+        return collection
+    return collection.with_options(read_preference=LIST_READ_PREFERENCE)
+
+# === LIST SERIALIZATION ===
+# Large lists skip FastAPI's response_model pass (validate, jsonable_encoder, json.dumps):
+# documents are validated once in bulk and pydantic-core writes the JSON bytes directly.
+# response_model stays on the routes for the OpenAPI schema.
+CLIENT_LIST = TypeAdapter(List[Client])
+APPOINTMENT_LIST = TypeAdapter(List[Appointment])
+NOTE_LIST = TypeAdapter(List[HouseNote])
+
+LIST_LIMIT = 1000
+
+def list_response(adapter: TypeAdapter, docs: list, headers: Optional[dict] = None) -> Response:
+    return Response(adapter.dump_json(adapter.validate_python(docs)), media_type="application/json", headers=headers)
+
+async def list_reply(collection, query: dict, adapter: TypeAdapter, if_none_match: Optional[str],
+                     sort: Optional[list] = None) -> Response:
+    """304 if the list is unchanged, else the list with its ETag.
+
+    Both reads may go to different secondaries, so the ETag sent with a body is
+    recomputed from that body: a tag newer than the list it labels would make
+    clients revalidate a stale copy as current.
+    """
+    collection = list_reads(collection)
+    etag = await list_etag(collection, query)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    cursor = collection.find(query, {"_id": 0}).max_time_ms(MONGO_MAX_TIME_MS)
+    if sort:
+        cursor = cursor.sort(sort)
+    docs = await cursor.to_list(LIST_LIMIT)
+    if len(docs) < LIST_LIMIT:
+        etag = docs_etag(docs)
+    return list_response(adapter, docs, {"ETag": etag})
+
 # === CLIENT ENDPOINTS ===
 @api_router.post("/clients", response_model=Client)
-async def create_client(client_data: ClientCreate, user: User = Depends(get_current_user)):
+async def create_client(client_data: ClientCreate, response: Response, user: User = Depends(get_current_user)):
     client_obj = Client(**client_data.model_dump(), user_id=user.user_id)
-    doc = client_obj.model_dump()
+    doc = with_location(client_obj.model_dump())
     await db.clients.insert_one(doc)
+    response.headers["ETag"] = version_etag(doc)
     return client_obj
 
 @api_router.get("/clients", response_model=List[Client])
-async def get_clients(user: User = Depends(get_current_user)):
-    clients = await db.clients.find({"user_id": user.user_id}, {"_id": 0}).to_list(1000)
-    return clients
+async def get_clients(if_none_match: Optional[str] = Header(None), user: User = Depends(get_current_user)):
+    return await list_reply(db.clients, {"user_id": user.user_id}, CLIENT_LIST, if_none_match)
+
+@api_router.get("/clients/near", response_model=List[ClientNear])
+async def get_clients_near(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_miles: float = Query(10.0, gt=0, le=500),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    user: User = Depends(get_current_user)
+):
+    """Clients whose address lies within radius_miles, nearest first; dates filter on created_at"""
+    query = {"user_id": user.user_id, **date_range_filter("created_at", None, date_from, date_to)}
+    return await geo_near(db.clients, latitude, longitude, radius_miles, query, limit)
 
 @api_router.get("/clients/{client_id}", response_model=Client)
-async def get_client(client_id: str, user: User = Depends(get_current_user)):
+async def get_client(client_id: str, response: Response, if_none_match: Optional[str] = Header(None),
+                     user: User = Depends(get_current_user)):
     client = await db.clients.find_one({"id": client_id, "user_id": user.user_id}, {"_id": 0})
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
+    etag = version_etag(client)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return client
 
 @api_router.put("/clients/{client_id}", response_model=Client)
-async def update_client(client_id: str, client_data: ClientCreate, user: User = Depends(get_current_user)):
-    existing = await db.clients.find_one({"id": client_id, "user_id": user.user_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Client not found")
-    update_data = client_data.model_dump()
-    await db.clients.update_one({"id": client_id}, {"$set": update_data})
-    updated = await db.clients.find_one({"id": client_id}, {"_id": 0})
+async def update_client(client_id: str, client_data: ClientCreate, response: Response,
+                        if_match: Optional[str] = Header(None), user: User = Depends(get_current_user)):
+    query = {"id": client_id, "user_id": user.user_id}
+    updated = await db.clients.find_one_and_update(
+        if_match_filter(query, if_match),
+        versioned(geo_update(client_data.model_dump())),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        await raise_write_miss(db.clients, query, if_match, "Client not found")
+    response.headers["ETag"] = version_etag(updated)
     return updated
 
 @api_router.delete("/clients/{client_id}")
-async def delete_client(client_id: str, user: User = Depends(get_current_user)):
-    result = await db.clients.delete_one({"id": client_id, "user_id": user.user_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Client not found")
-    return {"message": "Client deleted"}
+async def delete_client(client_id: str, if_match: Optional[str] = Header(None),
+                        user: User = Depends(get_current_user)):
+    query = {"id": client_id, "user_id": user.user_id}
+
+    async def cascade(session):
+        result = await db.clients.delete_one(if_match_filter(query, if_match), session=session)
+        if result.deleted_count == 0:
+            await raise_write_miss(db.clients, query, if_match, "Client not found")
+        await record_tombstones(user.user_id, "clients", [client_id], session)
+        return await delete_appointments_cascade(user.user_id, {"client_id": client_id}, session)
+
+    removed = await run_in_transaction(cascade)
+    return {"message": "Client deleted", "appointments_deleted": removed}
+
+# === CASCADING DELETES ===
+CASCADE_BATCH_SIZE = 1000
+ORPHAN_SWEEP_PAGE_SIZE = 500
+ORPHAN_SWEEP_INTERVAL_SECONDS = int(os.environ.get("ORPHAN_SWEEP_INTERVAL_SECONDS", "3600"))
+# Every worker runs the sweeper; the lease lets one of them sweep so tombstones and deletes aren't doubled
+ORPHAN_SWEEP_LOCK = "orphan-sweeper"
+# None until the first transaction attempt tells us whether the deployment supports them
+_transactions_supported: Optional[bool] = None
+_orphan_sweep_task: Optional[asyncio.Task] = None
+
+async def run_in_transaction(operation):
+    """Run `operation(session)` in a transaction, or with no session on a standalone server"""
+    global _transactions_supported
+    if _transactions_supported is not False:
+        try:
+            async with await db.client.start_session() as session:
+                async with session.start_transaction():
+                    result = await operation(session)
+            _transactions_supported = True
+            return result
+        except OperationFailure as e:
+            # IllegalOperation: transactions need a replica set or mongos
+            if e.code != 20:
+                raise
+            _transactions_supported = False
+    return await operation(None)
+
+async def delete_notes_for_appointments(user_id: str, appointment_ids: List[str], session=None) -> int:
+    """Delete (and tombstone) the notes attached to the given appointments"""
+    notes = await db.house_notes.find(
+        {"appointment_id": {"$in": appointment_ids}, "user_id": user_id}, {"_id": 0, "id": 1}, session=session
+    ).to_list(None)
+    if not notes:
+        return 0
+    note_ids = [n["id"] for n in notes]
+    result = await db.house_notes.delete_many({"id": {"$in": note_ids}, "user_id": user_id}, session=session)
+    await record_tombstones(user_id, "house_notes", note_ids, session)
+    return result.deleted_count
+
+async def delete_appointments_cascade(user_id: str, query: dict, session=None) -> int:
+    """Delete matching appointments and their notes in batches of $in deletes"""
+    query = {**query, "user_id": user_id}
+    removed = 0
+    while True:
+        batch = await db.appointments.find(query, {"_id": 0, "id": 1}, session=session).to_list(CASCADE_BATCH_SIZE)
+        if not batch:
+            return removed
+        ids = [a["id"] for a in batch]
+        await delete_notes_for_appointments(user_id, ids, session)
+        result = await db.appointments.delete_many({"id": {"$in": ids}, "user_id": user_id}, session=session)
+        await record_tombstones(user_id, "appointments", ids, session)
+        removed += result.deleted_count
+        if len(batch) < CASCADE_BATCH_SIZE:
+            return removed
+
+async def sweep_orphans_in(collection, ref_field: str, parent, lock: Optional[str] = None) -> int:
+    """Page through `collection` by _id and delete documents whose `ref_field` parent is gone
+
+    With `lock`, the lease is renewed before each page and the sweep stops if it was lost.
+    """
+    removed = 0
+    last_id = None
+    while True:
+        if lock and not await acquire_lock(lock):
+            logger.info(f"Lost {lock} lock, stopping sweep of {collection.name}")
+            return removed
+        query = {ref_field: {"$nin": ["", None]}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        page = await collection.find(query, {"_id": 1, "id": 1, "user_id": 1, ref_field: 1}).sort("_id", 1).to_list(ORPHAN_SWEEP_PAGE_SIZE)
+        if not page:
+            return removed
+        last_id = page[-1]["_id"]
+        refs = list({d[ref_field] for d in page})
+        parents = await parent.find({"id": {"$in": refs}}, {"_id": 0, "id": 1, "user_id": 1}).to_list(None)
+        owned = {(p.get("user_id"), p["id"]) for p in parents}
+        orphans = [d for d in page if (d.get("user_id"), d[ref_field]) not in owned]
+        if orphans:
+            result = await collection.delete_many({"_id": {"$in": [d["_id"] for d in orphans]}})
+            removed += result.deleted_count
+            by_user = {}
+            for d in orphans:
+                by_user.setdefault(d.get("user_id"), []).append(d.get("id"))
+            for user_id, ids in by_user.items():
+                await record_tombstones(user_id, collection.name, ids)
+        if len(page) < ORPHAN_SWEEP_PAGE_SIZE:
+            return removed
+
+async def sweep_orphans(lock: Optional[str] = None) -> dict:
+    """Remove appointments whose client is gone, then notes whose appointment is gone"""
+    appointments = await sweep_orphans_in(db.appointments, "client_id", db.clients, lock)
+    notes = await sweep_orphans_in(db.house_notes, "appointment_id", db.appointments, lock)
+    return {"appointments": appointments, "house_notes": notes}
+
+async def sweep_orphans_leased() -> Optional[dict]:
+    """Sweep while holding ORPHAN_SWEEP_LOCK; None when another worker holds it"""
+    if not await acquire_lock(ORPHAN_SWEEP_LOCK):
+        return None
+    try:
+        return await sweep_orphans(ORPHAN_SWEEP_LOCK)
+    finally:
+        await release_lock(ORPHAN_SWEEP_LOCK)
+
+async def orphan_sweeper():
+    while True:
+        await asyncio.sleep(ORPHAN_SWEEP_INTERVAL_SECONDS)
+        try:
+            removed = await sweep_orphans_leased()
+            if removed and any(removed.values()):
+                logger.info(f"Orphan sweep removed {removed}")
+        except Exception as e:
+            logger.error(f"Orphan sweep error: {e}")
+
+# === SCHEDULE VALIDATION ===
+# Same drive-time estimate as optimize_route
+MINUTES_PER_MILE = 3
+SCHEDULE_FIELDS = {"_id": 0, "id": 1, "start_time": 1, "end_time": 1, "latitude": 1, "longitude": 1}
+
+def travel_minutes(origin: dict, destination: dict) -> Optional[int]:
+    """Drive time between two stops, or None when either lacks coordinates"""
+    if origin.get("latitude") and origin.get("longitude") and destination.get("latitude") and destination.get("longitude"):
+        miles = haversine_distance(origin["latitude"], origin["longitude"], destination["latitude"], destination["longitude"])
+        return math.ceil(miles * MINUTES_PER_MILE)
+    return None
+
+def appointment_interval(appt: dict) -> scheduling.Interval:
+    start = time_to_minutes(appt.get("start_time", ""))
+    end = time_to_minutes(appt.get("end_time", ""))
+    if end < start:
+        end += 24 * 60
+    return scheduling.Interval(start, end, appt)
+
+async def day_schedule(user_id: str, date: str, exclude_id: Optional[str] = None) -> scheduling.IntervalTree:
+    query = {"user_id": user_id, "date": date}
+    if exclude_id:
+        query["id"] = {"$ne": exclude_id}
+    appointments = await db.appointments.find(query, SCHEDULE_FIELDS).to_list(1000)
+    return scheduling.IntervalTree([appointment_interval(a) for a in appointments])
+
+def conflict_model(conflict: scheduling.Conflict) -> ScheduleConflict:
+    return ScheduleConflict(
+        kind=conflict.kind,
+        appointment_id=conflict.interval.item.get("id", ""),
+        conflicts_with=conflict.other.item.get("id", ""),
+        overlap_minutes=conflict.overlap_minutes,
+        travel_minutes=conflict.travel_minutes,
+        gap_minutes=conflict.gap_minutes,
+    )
+
+async def check_schedule(user_id: str, appt: dict, exclude_id: Optional[str] = None,
+                         strict: bool = False) -> List[ScheduleConflict]:
+    """Overlaps and too-short drive gaps `appt` would create; with `strict`, 409 instead"""
+    tree = await day_schedule(user_id, appt["date"], exclude_id)
+    conflicts = [conflict_model(c) for c in scheduling.find_conflicts(tree, appointment_interval(appt), travel_minutes)]
+    if conflicts and strict:
+        overlaps = sum(1 for c in conflicts if c.kind == "overlap")
+        raise HTTPException(
+            status_code=409,
+            detail=f"Appointment conflicts with the schedule ({overlaps} overlapping, "
+                   f"{len(conflicts) - overlaps} without enough travel time)",
+        )
+    return conflicts
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+AVAILABILITY_MAX_DAYS = 31
+
+def minutes_to_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+@api_router.get("/availability", response_model=List[AvailabilitySlot])
+async def get_availability(
+    date_from: str,
+    date_to: Optional[str] = None,
+    duration: int = Query(60, ge=5, le=12 * 60),
+    address: Optional[str] = None,
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    limit: int = Query(20, ge=1, le=200),
+    user: User = Depends(get_current_user)
+):
+    """Open slots for a new viewing, ranked by added drive time then earliest.
+
+    Working hours, days and time zone come from the user's settings. The
+    property is placed by latitude/longitude, or by geocoding `address`; without
+    either, travel time to neighbouring stops is not accounted for.
+    """
+    first = parse_range_bound(date_from, end=False)
+    last = parse_range_bound(date_to or date_from, end=True)
+    days = (last - first).days
+    if days < 1 or days > AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must cover 1 to {AVAILABILITY_MAX_DAYS} days")
+    if (latitude is None or longitude is None) and address:
+        try:
+            geocoded = await geocode_address(address)
+        except Exception as e:
+            logger.error(f"Availability geocoding error: {e}")
+            geocoded = None
+        if geocoded:
+            latitude, longitude = geocoded["latitude"], geocoded["longitude"]
+    candidate = {"latitude": latitude, "longitude": longitude}
+
+    settings = await cached_user_settings(user.user_id) or UserSettings().model_dump()
+    day_start = time_to_minutes(settings.get("workStartTime", "09:00"))
+    day_end = time_to_minutes(settings.get("workEndTime", "18:00"))
+    work_days = set(settings.get("workDays", []))
+
+    # One indexed range scan for the whole period, grouped by day in memory. It starts a
+    # day early so a booking that runs past midnight also blocks the start of the next day.
+    appointments = await db.appointments.find(
+        {"user_id": user.user_id, "start_at": {"$gte": first - timedelta(days=1), "$lt": last}},
+        SCHEDULE_FIELDS | {"date": 1}
+    ).to_list(5000)
+    by_date = {}
+    for appt in appointments:
+        interval = appointment_interval(appt)
+        by_date.setdefault(appt.get("date"), []).append(interval)
+        if interval.end > 24 * 60:
+            try:
+                next_day = (datetime.strptime(appt.get("date") or "", "%Y-%m-%d") + timedelta(days=1)).date().isoformat()
+            except ValueError:
+                continue
+            by_date.setdefault(next_day, []).append(
+                scheduling.Interval(interval.start - 24 * 60, interval.end - 24 * 60, appt))
+
+    now = datetime.now(user_zone(settings))
+    today = now.date()
+    slots = []
+    for offset in range(days):
+        day = (first + timedelta(days=offset)).date()
+        if day < today or WEEKDAYS[day.weekday()] not in work_days:
+            continue
+        date = day.isoformat()
+        # Today's slots start no earlier than the current time in the user's zone
+        opens = max(day_start, math.ceil(now.hour * 60 + now.minute + now.second / 60)) if day == today else day_start
+        for slot in scheduling.free_slots(by_date.get(date, []), opens, day_end, duration, candidate, travel_minutes):
+            slots.append((date, slot))
+
+    slots.sort(key=lambda item: ((item[1].travel_before or 0) + (item[1].travel_after or 0), item[0], item[1].start))
+    return [
+        AvailabilitySlot(
+            date=date, start_time=minutes_to_time(slot.start), end_time=minutes_to_time(slot.end),
+            window_start=minutes_to_time(slot.window_start), window_end=minutes_to_time(slot.window_end),
+            travel_minutes_before=slot.travel_before, travel_minutes_after=slot.travel_after,
+        )
+        for date, slot in slots[:limit]
+    ]
 
 # === APPOINTMENT ENDPOINTS ===
-@api_router.post("/appointments", response_model=Appointment)
-async def create_appointment(appt_data: AppointmentCreate, user: User = Depends(get_current_user)):
+@api_router.post("/appointments", response_model=AppointmentWrite)
+async def create_appointment(appt_data: AppointmentCreate, response: Response, strict: bool = False,
+                             user: User = Depends(get_current_user)):
+    """Book an appointment; schedule conflicts are returned with it, or rejected with 409 when `strict`"""
     client = await db.clients.find_one({"id": appt_data.client_id, "user_id": user.user_id})
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    appt_obj = Appointment(**appt_data.model_dump(), user_id=user.user_id)
-    doc = appt_obj.model_dump()
+    appt_obj = Appointment(**with_schedule(appt_data.model_dump()), user_id=user.user_id)
+    conflicts = await check_schedule(user.user_id, appt_obj.model_dump(), strict=strict)
+    doc = with_location(appt_obj.model_dump())
     await db.appointments.insert_one(doc)
-    return appt_obj
+    response.headers["ETag"] = version_etag(doc)
+    return AppointmentWrite(**appt_obj.model_dump(), conflicts=conflicts)
 
 @api_router.get("/appointments", response_model=List[Appointment])
-async def get_appointments(date: Optional[str] = None, user: User = Depends(get_current_user)):
+async def get_appointments(date: Optional[str] = None,
+                           range_from: Optional[str] = Query(None, alias="from"),
+                           range_to: Optional[str] = Query(None, alias="to"),
+                           if_none_match: Optional[str] = Header(None), user: User = Depends(get_current_user)):
+    """List appointments for one `date`, or those starting in [from, to) ordered by start.
+
+    from/to accept a date or an ISO datetime; a bare date as `to` includes that day.
+    """
     query = {"user_id": user.user_id}
     if date:
         query["date"] = date
-    appointments = await db.appointments.find(query, {"_id": 0}).to_list(1000)
-    return appointments
+    if range_from or range_to:
+        start_at = {}
+        if range_from:
+            start_at["$gte"] = parse_range_bound(range_from, end=False)
+        if range_to:
+            start_at["$lt"] = parse_range_bound(range_to, end=True)
+        query["start_at"] = start_at
+    sort = [("start_at", 1), ("id", 1)] if "start_at" in query else None
+    return await list_reply(db.appointments, query, APPOINTMENT_LIST, if_none_match, sort)
+
+@api_router.get("/appointments/near", response_model=List[AppointmentNear])
+async def get_appointments_near(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_miles: float = Query(10.0, gt=0, le=500),
+    date: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    user: User = Depends(get_current_user)
+):
+    """Appointments within radius_miles of a point, nearest first"""
+    query = {"user_id": user.user_id, **date_range_filter("date", date, date_from, date_to)}
+    return await geo_near(db.appointments, latitude, longitude, radius_miles, query, limit)
+
+@api_router.get("/appointments/conflicts", response_model=ConflictReport)
+async def get_appointment_conflicts(date: str, user: User = Depends(get_current_user)):
+    """Every overlap and too-short travel gap in one day's schedule"""
+    tree = await day_schedule(user.user_id, date)
+    return ConflictReport(date=date, conflicts=[conflict_model(c) for c in scheduling.day_conflicts(tree, travel_minutes)])
 
 @api_router.get("/appointments/{appt_id}", response_model=Appointment)
-async def get_appointment(appt_id: str, user: User = Depends(get_current_user)):
+async def get_appointment(appt_id: str, response: Response, if_none_match: Optional[str] = Header(None),
+                          user: User = Depends(get_current_user)):
     appt = await db.appointments.find_one({"id": appt_id, "user_id": user.user_id}, {"_id": 0})
     if not appt:
         raise HTTPException(status_code=404, detail="Appointment not found")
+    etag = version_etag(appt)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return appt
 
-@api_router.put("/appointments/{appt_id}", response_model=Appointment)
-async def update_appointment(appt_id: str, appt_data: AppointmentCreate, user: User = Depends(get_current_user)):
-    existing = await db.appointments.find_one({"id": appt_id, "user_id": user.user_id})
-    if not existing:
+@api_router.put("/appointments/{appt_id}", response_model=AppointmentWrite)
+async def update_appointment(appt_id: str, appt_data: AppointmentCreate, response: Response, strict: bool = False,
+                             if_match: Optional[str] = Header(None), user: User = Depends(get_current_user)):
+    """Update an appointment; schedule conflicts are returned with it, or rejected with 409 when `strict`"""
+    query = {"id": appt_id, "user_id": user.user_id}
+    if not await db.appointments.count_documents(query, limit=1):
         raise HTTPException(status_code=404, detail="Appointment not found")
-    update_data = appt_data.model_dump()
-    await db.appointments.update_one({"id": appt_id}, {"$set": update_data})
-    updated = await db.appointments.find_one({"id": appt_id}, {"_id": 0})
-    return updated
+    conflicts = await check_schedule(
+        user.user_id, {**appt_data.model_dump(), "id": appt_id}, exclude_id=appt_id, strict=strict)
+    updated = await db.appointments.find_one_and_update(
+        if_match_filter(query, if_match),
+        versioned(geo_update(with_schedule(appt_data.model_dump()))),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        await raise_write_miss(db.appointments, query, if_match, "Appointment not found")
+    response.headers["ETag"] = version_etag(updated)
+    return {**updated, "conflicts": conflicts}
 
 @api_router.put("/appointments/{appt_id}/status")
-async def update_house_status(appt_id: str, status: HouseStatus, user: User = Depends(get_current_user)):
-    existing = await db.appointments.find_one({"id": appt_id, "user_id": user.user_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-    await db.appointments.update_one({"id": appt_id}, {"$set": {"house_status": status.value}})
+async def update_house_status(appt_id: str, status: HouseStatus, response: Response,
+                              if_match: Optional[str] = Header(None), user: User = Depends(get_current_user)):
+    query = {"id": appt_id, "user_id": user.user_id}
+    updated = await db.appointments.find_one_and_update(
+        if_match_filter(query, if_match),
+        versioned({"$set": {"house_status": status.value}}),
+        projection={"_id": 0, "version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        await raise_write_miss(db.appointments, query, if_match, "Appointment not found")
+    response.headers["ETag"] = version_etag(updated)
     return {"message": "Status updated", "status": status.value}
 
 @api_router.delete("/appointments/{appt_id}")
-async def delete_appointment(appt_id: str, user: User = Depends(get_current_user)):
-    result = await db.appointments.delete_one({"id": appt_id, "user_id": user.user_id})
+async def delete_appointment(appt_id: str, if_match: Optional[str] = Header(None),
+                             user: User = Depends(get_current_user)):
+    query = {"id": appt_id, "user_id": user.user_id}
+    result = await db.appointments.delete_one(if_match_filter(query, if_match))
     if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-    await db.house_notes.delete_many({"appointment_id": appt_id})
+        await raise_write_miss(db.appointments, query, if_match, "Appointment not found")
+    await record_tombstones(user.user_id, "appointments", [appt_id])
+    await delete_notes_for_appointments(user.user_id, [appt_id])
     return {"message": "Appointment deleted"}
 
+# === SEARCH ===
+# Deepest page reachable; each source is read up to offset + limit hits before merging
+SEARCH_MAX_WINDOW = 500
+SNIPPET_CHARS = 160
+SEARCH_TERM = re.compile(r'"([^"]+)"|(-?)(\S+)')
+SEARCH_WORD = re.compile(r"\w+")
+
+# type -> (collection, text fields in snippet preference order, title field)
+SEARCH_SOURCES = {
+    SearchType.CLIENT: ("clients", ("name", "email", "phone"), "name"),
+    SearchType.APPOINTMENT: ("appointments", ("property_address", "city"), "property_address"),
+    SearchType.NOTE: ("house_notes", ("notes",), "property_address"),
+}
+
+def search_terms(q: str) -> List[str]:
+    """Lower-cased words to highlight: phrases are split, negated terms dropped"""
+    terms = []
+    for phrase, negated, word in SEARCH_TERM.findall(q):
+        if negated:
+            continue
+        terms.extend(w.lower() for w in SEARCH_WORD.findall(phrase or word))
+    return terms
+
+def term_stem(term: str) -> str:
+    """Crude suffix strip so highlights line up with the text index's stemming"""
+    for suffix in ("ing", "es", "ed", "s"):
+        if len(term) > len(suffix) + 3 and term.endswith(suffix):
+            return term[:-len(suffix)]
+    return term
+
+def build_snippet(doc: dict, fields, terms: List[str]) -> Optional[SearchSnippet]:
+    """Window of the first field containing a term, with highlight offsets"""
+    stems = [term_stem(t) for t in terms]
+    for field in fields:
+        text = doc.get(field) or ""
+        spans = [[m.start(), m.end()] for m in SEARCH_WORD.finditer(text)
+                 if any(m.group().lower().startswith(stem) for stem in stems)]
+        if not spans:
+            continue
+        start = 0
+        if len(text) > SNIPPET_CHARS:
+            start = max(0, min(spans[0][0] - SNIPPET_CHARS // 4, len(text) - SNIPPET_CHARS))
+        window = text[start:start + SNIPPET_CHARS]
+        highlights = [[a - start, b - start] for a, b in spans if a >= start and b <= start + SNIPPET_CHARS]
+        return SearchSnippet(field=field, text=window, highlights=highlights)
+    return None
+
+async def search_source(search_type: SearchType, user_id: str, q: str, window: int):
+    """Top `window` hits by text score and the total match count for one collection"""
+    collection_name, _, _ = SEARCH_SOURCES[search_type]
+    collection = db[collection_name]
+    query = {"user_id": user_id, "$text": {"$search": q}}
+    if not window:
+        # Facet count only; limit(0) would mean no limit
+        return search_type, [], await collection.count_documents(query)
+    cursor = collection.find(
+        query, {"_id": 0, "location": 0, "score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"})]).limit(window)
+    hits, total = await asyncio.gather(cursor.to_list(window), collection.count_documents(query))
+    return search_type, hits, total
+
+@api_router.get("/search", response_model=SearchResult)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: Optional[List[SearchType]] = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=50),
+    user: User = Depends(get_current_user)
+):
+    """Full-text search over clients, appointments and notes, ranked by text score.
+
+    Uses MongoDB text search syntax ("exact phrase", -excluded). Facets count
+    matches per type regardless of the `type` filter.
+    """
+    if offset + limit > SEARCH_MAX_WINDOW:
+        raise HTTPException(status_code=400, detail=f"offset + limit must not exceed {SEARCH_MAX_WINDOW}")
+    wanted = set(type or SEARCH_SOURCES)
+    results = await asyncio.gather(*(
+        search_source(search_type, user.user_id, q, offset + limit if search_type in wanted else 0)
+        for search_type in SEARCH_SOURCES
+    ))
+
+    facets = {}
+    merged = []
+    for search_type, hits, total in results:
+        facets[search_type.value] = total
+        if search_type in wanted:
+            merged.extend((search_type, hit) for hit in hits)
+    merged.sort(key=lambda item: item[1]["score"], reverse=True)
+
+    terms = search_terms(q)
+    page = []
+    for search_type, doc in merged[offset:offset + limit]:
+        _, fields, title_field = SEARCH_SOURCES[search_type]
+        score = doc.pop("score")
+        page.append(SearchHit(
+            type=search_type, id=doc.get("id", ""), score=round(score, 4),
+            title=doc.get(title_field) or "", snippet=build_snippet(doc, fields, terms), document=doc,
+        ))
+    return SearchResult(
+        query=q, total=sum(facets[t.value] for t in wanted), facets=facets,
+        offset=offset, limit=limit, hits=page,
+    )
+
 # === HOUSE NOTES ENDPOINTS ===
 @api_router.post("/notes", response_model=HouseNote)
-async def create_house_note(note_data: HouseNoteCreate, user: User = Depends(get_current_user)):
+async def create_house_note(note_data: HouseNoteCreate, response: Response, user: User = Depends(get_current_user)):
     note_obj = HouseNote(**note_data.model_dump(), user_id=user.user_id)
     doc = note_obj.model_dump()
     await db.house_notes.insert_one(doc)
+    response.headers["ETag"] = version_etag(doc)
     return note_obj
 
 @api_router.get("/notes", response_model=List[HouseNote])
-async def get_house_notes(appointment_id: Optional[str] = None, user: User = Depends(get_current_user)):
+async def get_house_notes(appointment_id: Optional[str] = None,
+                          if_none_match: Optional[str] = Header(None), user: User = Depends(get_current_user)):
     query = {"user_id": user.user_id}
     if appointment_id:
         query["appointment_id"] = appointment_id
-    notes = await db.house_notes.find(query, {"_id": 0}).to_list(1000)
-    return notes
+    return await list_reply(db.house_notes, query, NOTE_LIST, if_none_match)
 
 @api_router.get("/notes/{note_id}", response_model=HouseNote)
-async def get_house_note(note_id: str, user: User = Depends(get_current_user)):
+async def get_house_note(note_id: str, response: Response, if_none_match: Optional[str] = Header(None),
+                         user: User = Depends(get_current_user)):
     note = await db.house_notes.find_one({"id": note_id, "user_id": user.user_id}, {"_id": 0})
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
+    etag = version_etag(note)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return note
 
 @api_router.put("/notes/{note_id}", response_model=HouseNote)
-async def update_house_note(note_id: str, note_data: HouseNoteCreate, user: User = Depends(get_current_user)):
-    existing = await db.house_notes.find_one({"id": note_id, "user_id": user.user_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Note not found")
-    update_data = note_data.model_dump()
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
-    await db.house_notes.update_one({"id": note_id}, {"$set": update_data})
-    updated = await db.house_notes.find_one({"id": note_id}, {"_id": 0})
+async def update_house_note(note_id: str, note_data: HouseNoteCreate, response: Response,
+                            if_match: Optional[str] = Header(None), user: User = Depends(get_current_user)):
+    query = {"id": note_id, "user_id": user.user_id}
+    updated = await db.house_notes.find_one_and_update(
+        if_match_filter(query, if_match),
+        versioned({"$set": note_data.model_dump()}),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        await raise_write_miss(db.house_notes, query, if_match, "Note not found")
+    response.headers["ETag"] = version_etag(updated)
     return updated
 
 @api_router.delete("/notes/{note_id}")
-async def delete_house_note(note_id: str, user: User = Depends(get_current_user)):
-    result = await db.house_notes.delete_one({"id": note_id, "user_id": user.user_id})
+async def delete_house_note(note_id: str, if_match: Optional[str] = Header(None),
+                            user: User = Depends(get_current_user)):
+    query = {"id": note_id, "user_id": user.user_id}
+    result = await db.house_notes.delete_one(if_match_filter(query, if_match))
     if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Note not found")
+        await raise_write_miss(db.house_notes, query, if_match, "Note not found")
+    await record_tombstones(user.user_id, "house_notes", [note_id])
     return {"message": "Note deleted"}
 
+# === BULK HELPERS ===
+BULK_BATCH_SIZE = 500
+BULK_MAX_ITEM_BYTES = 1024 * 1024
+
+async def iter_json_array(request: Request):
+    """Yield the elements of a top-level JSON array as the request body streams in"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    opened = closed = False
+    # Between elements exactly one comma is allowed; none before the first or after the last
+    after_item = after_comma = False
+    async for chunk in request.stream():
+        buffer += utf8.decode(chunk)
+        pos = 0
+        while not closed:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not opened:
+                if buffer[pos] != "[":
+                    raise HTTPException(status_code=400, detail="Request body must be a JSON array")
+                opened = True
+                pos += 1
+                continue
+            if buffer[pos] == "," and after_item:
+                after_item, after_comma = False, True
+                pos += 1
+                continue
+            if buffer[pos] == "]" and not after_comma:
+                closed = True
+                break
+            if buffer[pos] in ",]" or after_item:
+                raise HTTPException(status_code=400, detail="Malformed JSON array")
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Element is incomplete; wait for more of the body
+                break
+            if end == len(buffer):
+                # A number may continue in the next chunk; a valid body never ends on an element
+                break
+            pos = end
+            after_item, after_comma = True, False
+            yield item
+        buffer = buffer[pos:]
+        if len(buffer) > BULK_MAX_ITEM_BYTES:
+            raise HTTPException(status_code=413, detail="Bulk item too large")
+    if not closed:
+        raise HTTPException(status_code=400, detail="Malformed JSON array")
+
+async def iter_batches(items, size: int = BULK_BATCH_SIZE):
+    """Group an async iterator into lists of at most `size` items"""
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in error.errors())
+
+async def existing_ids(collection, user_id: str, ids) -> set:
+    """Ids from `ids` that exist and belong to the user, in one $in query"""
+    if not ids:
+        return set()
+    docs = await collection.find({"id": {"$in": list(ids)}, "user_id": user_id}, {"_id": 0, "id": 1}).to_list(None)
+    return {d["id"] for d in docs}
+
+async def apply_bulk_batch(collection, batch: List[tuple], user: User, create_model, doc_model,
+                           not_found: str, result: BulkResult, check_client: bool = False) -> List[str]:
+    """Validate and write one batch with an unordered bulk_write; returns deleted ids"""
+    outcomes = {}
+    parsed = []
+    for index, raw in batch:
+        if not isinstance(raw, dict):
+            outcomes[index] = BulkItemResult(index=index, status="error", error="Item must be an object")
+            continue
+        try:
+            op = BulkOp(raw.get("op", BulkOp.CREATE.value))
+        except ValueError:
+            outcomes[index] = BulkItemResult(index=index, op=str(raw.get("op")), status="error", error="Unknown op")
+            continue
+        data = None
+        if op != BulkOp.DELETE:
+            try:
+                data = create_model(**(raw.get("data") or {}))
+            except (ValidationError, TypeError) as e:
+                message = validation_message(e) if isinstance(e, ValidationError) else str(e)
+                outcomes[index] = BulkItemResult(index=index, op=op.value, status="error", error=message)
+                continue
+        if op != BulkOp.CREATE and not isinstance(raw.get("id"), str):
+            outcomes[index] = BulkItemResult(index=index, op=op.value, status="error", error="id required")
+            continue
+        parsed.append((index, op, raw.get("id"), data))
+
+    known = await existing_ids(collection, user.user_id, {item_id for _, op, item_id, _ in parsed if op != BulkOp.CREATE})
+    known_clients = None
+    if check_client:
+        known_clients = await existing_ids(db.clients, user.user_id, {d.client_id for _, _, _, d in parsed if d})
+
+    requests, request_items = [], []
+    for index, op, item_id, data in parsed:
+        if op != BulkOp.CREATE and item_id not in known:
+            outcomes[index] = BulkItemResult(index=index, op=op.value, id=item_id, status="error", error=not_found)
+            continue
+        if known_clients is not None and data and data.client_id not in known_clients:
+            outcomes[index] = BulkItemResult(index=index, op=op.value, id=item_id, status="error", error="Client not found")
+            continue
+        if op == BulkOp.CREATE:
+            obj = doc_model(**with_schedule(data.model_dump()), user_id=user.user_id)
+            item_id = obj.id
+            requests.append(InsertOne(with_location(obj.model_dump())))
+        elif op == BulkOp.UPDATE:
+            requests.append(UpdateOne({"id": item_id, "user_id": user.user_id}, versioned(geo_update(with_schedule(data.model_dump())))))
+        else:
+            requests.append(DeleteOne({"id": item_id, "user_id": user.user_id}))
+        request_items.append((index, op, item_id))
+
+    write_errors = {}
+    if requests:
+        try:
+            await collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            write_errors = {err["index"]: err.get("errmsg", "Write failed") for err in e.details.get("writeErrors", [])}
+
+    deleted_ids = []
+    done_status = {BulkOp.CREATE: "created", BulkOp.UPDATE: "updated", BulkOp.DELETE: "deleted"}
+    for position, (index, op, item_id) in enumerate(request_items):
+        if position in write_errors:
+            outcomes[index] = BulkItemResult(index=index, op=op.value, id=item_id, status="error", error=write_errors[position])
+            continue
+        outcomes[index] = BulkItemResult(index=index, op=op.value, id=item_id, status=done_status[op])
+        if op == BulkOp.DELETE:
+            deleted_ids.append(item_id)
+
+    for index, _ in batch:
+        item = outcomes[index]
+        result.results.append(item)
+        if item.status == "error":
+            result.failed += 1
+        else:
+            setattr(result, item.status, getattr(result, item.status) + 1)
+    return deleted_ids
+
+# === BULK ENDPOINTS ===
+@api_router.post("/clients/bulk", response_model=BulkResult)
+async def bulk_clients(request: Request, user: User = Depends(get_current_user)):
+    """Create/update/delete clients from a streamed JSON array of {op, id, data} items
+
+    Batches are written as the body arrives, so a 400 for a malformed array comes after
+    the batches before the error have already been applied.
+    """
+    result = BulkResult()
+    index = 0
+    async for raw_batch in iter_batches(iter_json_array(request)):
+        batch = list(enumerate(raw_batch, start=index))
+        index += len(batch)
+        deleted_ids = await apply_bulk_batch(db.clients, batch, user, ClientCreate, Client, "Client not found", result)
+        if deleted_ids:
+            await record_tombstones(user.user_id, "clients", deleted_ids)
+            await delete_appointments_cascade(user.user_id, {"client_id": {"$in": deleted_ids}})
+    return result
+
+@api_router.post("/appointments/bulk", response_model=BulkResult)
+async def bulk_appointments(request: Request, user: User = Depends(get_current_user)):
+    """Create/update/delete appointments from a streamed JSON array of {op, id, data} items
+
+    Batches are written as the body arrives, so a 400 for a malformed array comes after
+    the batches before the error have already been applied.
+    """
+    result = BulkResult()
+    index = 0
+    async for raw_batch in iter_batches(iter_json_array(request)):
+        batch = list(enumerate(raw_batch, start=index))
+        index += len(batch)
+        deleted_ids = await apply_bulk_batch(
+            db.appointments, batch, user, AppointmentCreate, Appointment, "Appointment not found", result,
+            check_client=True
+        )
+        if deleted_ids:
+            await record_tombstones(user.user_id, "appointments", deleted_ids)
+            await delete_notes_for_appointments(user.user_id, deleted_ids)
+    return result
+
+# === IMPORT PIPELINE ===
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_ERRORS = 1000
+IMPORT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+class ImportKind(str, Enum):
+    CLIENTS = "clients"
+    APPOINTMENTS = "appointments"
+
+class ImportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+async def iter_lines(request: Request):
+    """Yield lines (newline kept) from the request body as it streams in"""
+    utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in request.stream():
+        pending += utf8.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        for line in lines:
+            yield line
+    pending += utf8.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def iter_csv_rows(request: Request):
+    """Yield CSV rows as dicts keyed by the header row; quoted fields may span lines"""
+    header = None
+    record = ""
+    async for line in iter_lines(request):
+        record += line
+        # An odd number of quotes means a quoted field continues on the next line
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader(record.splitlines(keepends=True)), [])
+        record = ""
+        if not any(v.strip() for v in values):
+            continue
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        yield dict(zip(header, values))
+    if record:
+        raise HTTPException(status_code=400, detail="Unterminated quoted field in CSV")
+
+async def iter_ndjson_rows(request: Request):
+    async for line in iter_lines(request):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ValueError(f"Invalid JSON: {e.msg}")
+
+def import_geocode_address(kind: ImportKind, row: dict) -> Optional[str]:
+    """Address to geocode for an imported row without coordinates"""
+    if row.get("latitude") not in (None, "") and row.get("longitude") not in (None, ""):
+        return None
+    if kind == ImportKind.CLIENTS:
+        return row.get("current_address") or None
+    address = ", ".join(part for part in (row.get("property_address"), row.get("city")) if part)
+    return address or None
+
+@api_router.post("/import/{kind}")
+async def import_records(kind: ImportKind, request: Request, format: ImportFormat = ImportFormat.CSV,
+                         geocode: bool = True, user: User = Depends(get_current_user)):
+    """Stream a CSV or NDJSON upload into clients or appointments.
+
+    Rows are validated in chunks and written with unordered bulk writes. Progress is
+    kept in `import_jobs` and can be polled at /import-jobs/{id}; send an X-Import-Id
+    header to choose the id up front (409 if you have already used it).
+    """
+    job_id = request.headers.get("X-Import-Id") or uuid.uuid4().hex
+    if not IMPORT_ID_PATTERN.match(job_id):
+        raise HTTPException(status_code=400, detail="Invalid X-Import-Id")
+    now = datetime.now(timezone.utc).isoformat()
+    job = {
+        "id": job_id,
+        "user_id": user.user_id,
+        "kind": kind.value,
+        "format": format.value,
+        "status": "running",
+        "rows_processed": 0,
+        "rows_imported": 0,
+        "rows_failed": 0,
+        "geocode_queued": 0,
+        "errors": [],
+        "created_at": now,
+        "updated_at": now,
+    }
+    try:
+        await db.import_jobs.insert_one(dict(job))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Import id already used")
+
+    if kind == ImportKind.CLIENTS:
+        collection, create_model, doc_model, not_found = db.clients, ClientCreate, Client, "Client not found"
+    else:
+        collection, create_model, doc_model, not_found = db.appointments, AppointmentCreate, Appointment, "Appointment not found"
+
+    rows = iter_csv_rows(request) if format == ImportFormat.CSV else iter_ndjson_rows(request)
+    try:
+        async for chunk in iter_batches(rows, IMPORT_CHUNK_SIZE):
+            first_row = job["rows_processed"] + 1
+            batch = []
+            for row_number, row in enumerate(chunk, start=first_row):
+                if isinstance(row, dict):
+                    # Empty CSV cells fall back to model defaults
+                    data = {k: v for k, v in row.items() if k and v not in ("", None)}
+                    batch.append((row_number, {"op": "create", "data": data}))
+                elif len(job["errors"]) < IMPORT_MAX_ERRORS:
+                    message = str(row) if isinstance(row, ValueError) else "Row must be a JSON object"
+                    job["errors"].append({"row": row_number, "error": message})
+            chunk_result = BulkResult()
+            await apply_bulk_batch(collection, batch, user, create_model, doc_model, not_found, chunk_result,
+                                   check_client=kind == ImportKind.APPOINTMENTS)
+
+            rows_by_number = dict(batch)
+            for item in chunk_result.results:
+                if item.status == "error":
+                    if len(job["errors"]) < IMPORT_MAX_ERRORS:
+                        job["errors"].append({"row": item.index, "error": item.error})
+                    continue
+                address = import_geocode_address(kind, rows_by_number[item.index]["data"]) if geocode else None
+                if address and enqueue_geocode(collection.name, item.id, address):
+                    job["geocode_queued"] += 1
+
+            job["rows_processed"] += len(chunk)
+            job["rows_imported"] += chunk_result.created
+            job["rows_failed"] += len(chunk) - chunk_result.created
+            job["updated_at"] = datetime.now(timezone.utc).isoformat()
+            await db.import_jobs.update_one({"id": job_id, "user_id": user.user_id}, {"$set": job})
+        job["status"] = "completed"
+    except HTTPException as e:
+        job["status"] = "failed"
+        job["error"] = e.detail
+        raise
+    except Exception:
+        # Disconnects and database errors would otherwise leave the job "running" for pollers
+        job["status"] = "failed"
+        job["error"] = "Import interrupted"
+        raise
+    finally:
+        job["updated_at"] = datetime.now(timezone.utc).isoformat()
+        await db.import_jobs.update_one({"id": job_id, "user_id": user.user_id}, {"$set": job})
+    return job
+
+@api_router.get("/import-jobs/{job_id}")
+async def get_import_job(job_id: str, user: User = Depends(get_current_user)):
+    job = await db.import_jobs.find_one({"id": job_id, "user_id": user.user_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+# === DELTA SYNC ===
+SYNC_PAGE_SIZE = 1000
+SYNC_TOMBSTONE_DAYS = int(os.environ.get("SYNC_TOMBSTONE_DAYS", "30"))
+# Re-read writes stamped just before the previous token that may have committed after it
+SYNC_OVERLAP = timedelta(seconds=5)
+# Feed name in the response -> (collection, time field)
+SYNC_FEEDS = {
+    "clients": ("clients", "updated_at"),
+    "appointments": ("appointments", "updated_at"),
+    "notes": ("house_notes", "updated_at"),
+    "deleted": ("tombstones", "deleted_at"),
+}
+TOMBSTONE_FEEDS = {"clients": "clients", "appointments": "appointments", "house_notes": "notes"}
+
+async def record_tombstones(user_id: str, collection_name: str, ids: List[str], session=None):
+    """Remember deletions so /sync can tell other devices about them"""
+    if not ids:
+        return
+    now = datetime.now(timezone.utc)
+    await db.tombstones.insert_many([
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "collection": collection_name,
+            "doc_id": doc_id,
+            "deleted_at": now.isoformat(),
+            "expires_at": now + timedelta(days=SYNC_TOMBSTONE_DAYS),
+        }
+        for doc_id in ids
+    ], session=session)
+
+def encode_sync_token(state: dict) -> str:
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_sync_token(token: str) -> dict:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if state.get("s") is not None:
+            datetime.fromisoformat(state["s"])
+        if not isinstance(state.get("c"), dict):
+            raise ValueError
+        if state["c"]:
+            # Mid-sync tokens carry the high-water mark of the sync they continue
+            datetime.fromisoformat(state["h"])
+        return state
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+async def read_sync_feed(user_id: str, feed: str, since: Optional[str], after: Optional[list]) -> list:
+    """One page of a feed ordered by (time field, id), resuming after `after`"""
+    collection_name, field = SYNC_FEEDS[feed]
+    query = {"user_id": user_id}
+    if after:
+        query["$or"] = [{field: {"$gt": after[0]}}, {field: after[0], "id": {"$gt": after[1]}}]
+    elif since:
+        query[field] = {"$gte": since}
+    projection = {"_id": 0, "location": 0, "expires_at": 0}
+    cursor = db[collection_name].find(query, projection).sort([(field, 1), ("id", 1)]).limit(SYNC_PAGE_SIZE)
+    return await cursor.to_list(SYNC_PAGE_SIZE)
+
+@api_router.get("/sync")
+async def sync(since: Optional[str] = None, user: User = Depends(get_current_user)):
+    """Changes since a sync token: upserted documents plus tombstones for deletions.
+
+    Without a token (or with one older than tombstone retention) the response is a
+    full snapshot and `reset` is true. When `has_more` is true, call again with the
+    returned token before treating the device as up to date.
+    """
+    now = datetime.now(timezone.utc)
+    state = decode_sync_token(since) if since else {"s": None, "c": {}}
+    reset = state["s"] is None
+    if not reset and datetime.fromisoformat(state["s"]) < now - timedelta(days=SYNC_TOMBSTONE_DAYS):
+        state, reset = {"s": None, "c": {}}, True
+    first_page = not state["c"]
+    if first_page:
+        state["h"] = now.isoformat()
+    window_start = None if reset else (datetime.fromisoformat(state["s"]) - SYNC_OVERLAP).isoformat()
+
+    response = {"reset": reset and first_page, "clients": [], "appointments": [], "notes": [],
+                "deleted": {feed: [] for feed in TOMBSTONE_FEEDS.values()}, "settings": None, "priorities": None}
+    cursors = {}
+    for feed, (_, field) in SYNC_FEEDS.items():
+        cursor = state["c"].get(feed)
+        if cursor is True or (feed == "deleted" and reset):
+            cursors[feed] = True
+            continue
+        docs = await read_sync_feed(user.user_id, feed, window_start, cursor)
+        if feed == "deleted":
+            for tombstone in docs:
+                response["deleted"][TOMBSTONE_FEEDS[tombstone["collection"]]].append(tombstone["doc_id"])
+        else:
+            response[feed] = docs
+        if len(docs) < SYNC_PAGE_SIZE:
+            cursors[feed] = True
+        else:
+            cursors[feed] = [docs[-1][field], docs[-1]["id"]]
+
+    if first_page:
+        settings_query = {"user_id": user.user_id}
+        if window_start:
+            settings_query["updated_at"] = {"$gte": window_start}
+        response["settings"] = await db.user_settings.find_one(settings_query, {"_id": 0})
+        response["priorities"] = await db.route_priorities.find_one(settings_query, {"_id": 0})
+
+    has_more = not all(c is True for c in cursors.values())
+    if has_more:
+        next_state = {"s": state["s"], "h": state["h"], "c": cursors}
+    else:
+        # The next sync starts from when this (possibly multi-page) sync began
+        next_state = {"s": state["h"], "c": {}}
+    response["has_more"] = has_more
+    response["token"] = encode_sync_token(next_state)
+    return response
+
+# === LIVE UPDATES (SSE) ===
+SSE_HEARTBEAT_SECONDS = 15
+SSE_QUEUE_SIZE = 256
+SSE_MAX_CONNECTIONS_PER_USER = 5
+# Collection -> event type pushed to clients
+LIVE_COLLECTIONS = {"clients": "client", "appointments": "appointment", "house_notes": "house_note"}
+SSE_CONNECTIONS = metrics.REGISTRY.gauge("sse_connections", "Open server-sent event connections")
+
+class ChangeHub:
+    """Fan one MongoDB change stream out to every connected user's SSE queues.
+
+    Deletes arrive as inserts into `tombstones`, which carry the user_id a
+    delete event lacks. A subscriber whose queue overflows gets its backlog
+    replaced by a single `resync` event and is expected to call /sync.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+        self.available = True
+
+    def connections(self, user_id: str) -> int:
+        return len(self._subscribers.get(user_id, ()))
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        if self.available and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+        if not self._subscribers and self._task:
+            self._task.cancel()
+            self._task = None
+
+    def publish(self, user_id: str, event: dict):
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"event": "resync"})
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    @staticmethod
+    def to_event(change: dict) -> Optional[tuple]:
+        """Map a change event to (user_id, compact delta)"""
+        collection = change["ns"]["coll"]
+        operation = change["operationType"]
+        doc = change.get("fullDocument") or {}
+        if collection == "tombstones":
+            event_type = LIVE_COLLECTIONS.get(doc.get("collection"))
+            if not event_type:
+                return None
+            return doc.get("user_id"), {"event": "delete", "type": event_type, "id": doc.get("doc_id")}
+        user_id = doc.get("user_id")
+        if not user_id:
+            return None
+        event_type = LIVE_COLLECTIONS[collection]
+        if operation == "update":
+            description = change.get("updateDescription", {})
+            fields = {k: v for k, v in description.get("updatedFields", {}).items() if k != "location"}
+            return user_id, {"event": "update", "type": event_type, "id": doc.get("id"),
+                             "fields": fields, "removed": description.get("removedFields", [])}
+        data = {k: v for k, v in doc.items() if k not in ("_id", "location")}
+        return user_id, {"event": "upsert", "type": event_type, "id": doc.get("id"), "data": data}
+
+    async def _run(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(LIVE_COLLECTIONS) + ["tombstones"]},
+            "operationType": {"$in": ["insert", "update", "replace"]},
+        }}]
+        backoff = 1
+        while self._subscribers:
+            try:
+                async with db.watch(pipeline, full_document="updateLookup",
+                                    resume_after=self._resume_token) as stream:
+                    backoff = 1
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        mapped = self.to_event(change)
+                        if mapped:
+                            self.publish(*mapped)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                # 40573: change streams need a replica set or sharded cluster
+                if e.code == 40573:
+                    logger.warning("Change streams unavailable; live updates disabled")
+                    self.available = False
+                    for user_id in list(self._subscribers):
+                        self.publish(user_id, {"event": "unavailable"})
+                    return
+                logger.error(f"Change stream error: {e}")
+                self._resume_token = None
+            except Exception as e:
+                logger.error(f"Change stream error: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+change_hub = ChangeHub()
+
+def format_sse(event: dict) -> str:
+    name = event.pop("event")
+    return f"event: {name}\ndata: {json.dumps(event, default=export_default)}\n\n"
+
+@api_router.get("/events")
+async def live_events(request: Request, user: User = Depends(get_current_user)):
+    """Server-sent events with compact deltas for the user's clients, appointments and notes.
+
+    Events: upsert, update, delete, resync (call /sync) and unavailable (fall back to
+    polling /sync). A comment heartbeat is sent every 15 seconds.
+    """
+    if change_hub.connections(user.user_id) >= SSE_MAX_CONNECTIONS_PER_USER:
+        raise HTTPException(status_code=429, detail="Too many live connections")
+
+    async def stream():
+        # Subscribing here, not before the response starts, ties the queue to this generator's
+        # finally; a client that disconnects before the first chunk never subscribes at all
+        queue = change_hub.subscribe(user.user_id)
+        if not change_hub.available:
+            queue.put_nowait({"event": "unavailable"})
+        SSE_CONNECTIONS.inc()
+        try:
+            yield f"retry: {SSE_HEARTBEAT_SECONDS * 1000}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                unavailable = event["event"] == "unavailable"
+                yield format_sse(dict(event))
+                if unavailable:
+                    break
+        finally:
+            SSE_CONNECTIONS.dec()
+            change_hub.unsubscribe(user.user_id, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# === EXPORT ===
+EXPORT_BATCH_SIZE = 500
+EXPORT_FLUSH_BYTES = 64 * 1024
+# Section name -> (collection, record type, CSV model); exported in this order
+EXPORT_SECTIONS = {
+    "clients": ("clients", "client", Client),
+    "appointments": ("appointments", "appointment", Appointment),
+    "notes": ("house_notes", "house_note", HouseNote),
+    "settings": (None, None, None),
+}
+# Collections exported, in this order, as the settings section's records
+SETTINGS_RECORDS = ("user_settings", "route_priorities")
+
+def encode_export_cursor(section: str, after: str) -> str:
+    raw = json.dumps({"s": section, "a": after}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_export_cursor(cursor: str, sections=EXPORT_SECTIONS) -> tuple:
+    """(section, key) from a cursor; its section must be one of `sections` being exported"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["s"] not in sections or not isinstance(data["a"], str):
+            raise ValueError
+        if data["s"] == "settings" and data["a"] not in SETTINGS_RECORDS:
+            raise ValueError
+        return data["s"], data["a"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid export cursor")
+
+def export_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+async def iter_export_records(user_id: str, sections: List[str], cursor: Optional[str]):
+    """Yield (section, key, record type, document) in a stable order, resuming after `cursor`"""
+    start_section, after = decode_export_cursor(cursor, sections) if cursor else (None, None)
+    started = start_section is None
+    for section in sections:
+        if not started:
+            if section != start_section:
+                continue
+            started = True
+        else:
+            after = None
+        collection_name, record_type, _ = EXPORT_SECTIONS[section]
+        if section == "settings":
+            # Resume by position in the record order; the keys do not sort in that order
+            remaining = SETTINGS_RECORDS[SETTINGS_RECORDS.index(after) + 1:] if after else SETTINGS_RECORDS
+            for key in remaining:
+                doc = await db[key].find_one({"user_id": user_id}, {"_id": 0})
+                if doc:
+                    yield section, key, key, doc
+            continue
+        query = {"user_id": user_id}
+        if after:
+            query["id"] = {"$gt": after}
+        cursor_docs = db[collection_name].find(query, {"_id": 0, "location": 0}).sort("id", 1).batch_size(EXPORT_BATCH_SIZE)
+        async for doc in cursor_docs:
+            yield section, doc["id"], record_type, doc
+
+async def iter_export_chunks(records, fmt: str, compress: bool, csv_fields: Optional[List[str]]):
+    """Serialize export records into ~64KB chunks, optionally gzip-compressed on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(csv_fields + ["cursor"])
+
+    def drain(final: bool = False) -> bytes:
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        if compressor:
+            data = compressor.compress(data)
+            if final:
+                data += compressor.flush()
+        return data
+
+    async for section, key, record_type, doc in records:
+        cursor = encode_export_cursor(section, key)
+        if writer:
+            writer.writerow([export_default(doc.get(f)) if doc.get(f) is not None else "" for f in csv_fields] + [cursor])
+        else:
+            buffer.write(json.dumps({"type": record_type, "cursor": cursor, "data": doc}, default=export_default))
+            buffer.write("\n")
+        if buffer.tell() >= EXPORT_FLUSH_BYTES:
+            chunk = drain()
+            if chunk:
+                yield chunk
+    chunk = drain(final=True)
+    if chunk:
+        yield chunk
+
+@api_router.get("/export")
+async def export_data(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    collections: str = "clients,appointments,notes,settings",
+    cursor: Optional[str] = None,
+    user: User = Depends(get_current_user)
+):
+    """Stream the user's data straight from Motor cursors.
+
+    Every record carries a `cursor`; pass the last one received to resume an
+    interrupted export. CSV exports must name exactly one of clients,
+    appointments or notes.
+    """
+    requested = [c.strip() for c in collections.split(",") if c.strip()]
+    unknown = [c for c in requested if c not in EXPORT_SECTIONS]
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(unknown) or 'none'}")
+    sections = [name for name in EXPORT_SECTIONS if name in requested]
+
+    csv_fields = None
+    if format == "csv":
+        if len(sections) != 1 or sections[0] == "settings":
+            raise HTTPException(status_code=400, detail="CSV export needs exactly one of clients, appointments, notes")
+        csv_fields = list(EXPORT_SECTIONS[sections[0]][2].model_fields)
+    if cursor:
+        decode_export_cursor(cursor, sections)
+
+    records = iter_export_records(user.user_id, sections, cursor)
+    filename = f"export.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else ("text/csv" if format == "csv" else "application/x-ndjson")
+    return StreamingResponse(
+        iter_export_chunks(records, format, gzip, csv_fields),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 # === ROUTE PRIORITY SETTINGS ===
 @api_router.get("/priorities", response_model=RoutePrioritySettings)
 async def get_priorities(user: User = Depends(get_current_user)):
-    settings = await db.route_priorities.find_one({"user_id": user.user_id}, {"_id": 0})
+    settings = await cached_route_priorities(user.user_id)
     if not settings:
         return RoutePrioritySettings(user_id=user.user_id)
     return settings
@@ -489,29 +2066,16 @@ async def get_priorities(user: User = Depends(get_current_user)):
 async def update_priorities(settings: RoutePrioritySettings, user: User = Depends(get_current_user)):
     settings.user_id = user.user_id
     doc = settings.model_dump()
+    doc["updated_at"] = datetime.now(timezone.utc).isoformat()
     await db.route_priorities.update_one(
         {"user_id": user.user_id}, 
         {"$set": doc}, 
         upsert=True
     )
+    await USER_CACHE.write("route_priorities", user.user_id, doc)
     return settings
 
 # === ROUTE OPTIMIZATION ===
-def calculate_distance(appt1: dict, appt2: dict) -> float:
-    """Calculate real distance if coordinates available, otherwise use mock"""
-    lat1, lon1 = appt1.get("latitude"), appt1.get("longitude")
-    lat2, lon2 = appt2.get("latitude"), appt2.get("longitude")
-    
-    if lat1 and lon1 and lat2 and lon2:
-        return haversine_distance(lat1, lon1, lat2, lon2)
-    
-    # Fallback to mock distance
-    addr1 = appt1.get("property_address", "")
-    addr2 = appt2.get("property_address", "")
-    hash1 = sum(ord(c) for c in addr1) % 100
-    hash2 = sum(ord(c) for c in addr2) % 100
-    return abs(hash1 - hash2) * 0.1 + 1.0
-
 def time_to_minutes(time_str: str) -> int:
     try:
         parts = time_str.split(":")
@@ -526,79 +2090,36 @@ async def optimize_route(date: str, user: User = Depends(get_current_user)):
     if not appointments:
         return OptimizedRoute(appointments=[], total_estimated_time=0, total_distance_estimate=0, finish_time_estimate="")
     
-    settings = await db.route_priorities.find_one({"user_id": user.user_id}, {"_id": 0})
+    settings = await cached_route_priorities(user.user_id)
     if not settings:
         settings = RoutePrioritySettings().model_dump()
     
     priorities = {p["key"]: p for p in settings["priorities"] if p["enabled"]}
     
-    scored_appointments = []
-    for appt in appointments:
-        score = 0
-        if "open_house" in priorities and appt.get("is_open_house"):
-            score += priorities["open_house"]["weight"] * 100
-        if "appointment_time" in priorities:
-            time_mins = time_to_minutes(appt.get("start_time", "12:00"))
-            score += priorities["appointment_time"]["weight"] * (1440 - time_mins) / 14.4
-        if "time_at_house" in priorities:
-            time_at = appt.get("time_at_house", 60)
-            score += priorities["time_at_house"]["weight"] * (120 - min(time_at, 120)) / 1.2
-        scored_appointments.append((score, appt))
-    
-    scored_appointments.sort(key=lambda x: x[0], reverse=True)
-    
-    optimized = []
-    remaining = [a[1] for a in scored_appointments]
-    
-    if remaining:
-        current = remaining.pop(0)
-        current["order_index"] = 0
-        optimized.append(current)
-        
-        order_idx = 1
-        while remaining:
-            best_idx = 0
-            best_score = float('inf')
-            
-            for i, appt in enumerate(remaining):
-                distance = calculate_distance(current, appt)
-                if "city_cluster" in priorities:
-                    if current.get("city") == appt.get("city"):
-                        distance -= priorities["city_cluster"]["weight"]
-                if distance < best_score:
-                    best_score = distance
-                    best_idx = i
-            
-            current = remaining.pop(best_idx)
-            current["order_index"] = order_idx
-            optimized.append(current)
-            order_idx += 1
-    
-    total_time = sum(a.get("time_at_house", 30) for a in optimized)
-    total_distance = 0
-    for i in range(len(optimized) - 1):
-        total_distance += calculate_distance(optimized[i], optimized[i + 1])
+    # NumPy is imported with the solver on the first optimization, keeping it out of cold start
+    import routing
+
+    # The solver works on columns; documents are only copied back out in visiting order
+    plan = routing.plan_route(appointments, priorities)
+    optimized = [{**appointments[i], "order_index": order_idx} for order_idx, i in enumerate(plan.order.tolist())]
+    
+    total_time = sum(a.get("time_at_house", 30) for a in appointments)
+    total_distance = plan.distance_miles
     
     travel_time = int(total_distance * 3)
     total_time += travel_time
     
-    if optimized:
-        first_start = time_to_minutes(optimized[0].get("start_time", "09:00"))
-        finish_mins = first_start + total_time
-        finish_hours = finish_mins // 60
-        finish_mins_remain = finish_mins % 60
-        finish_time = f"{finish_hours:02d}:{finish_mins_remain:02d}"
-    else:
-        finish_time = ""
-    
-    appt_models = [Appointment(**a) for a in optimized]
+    first_start = time_to_minutes(optimized[0].get("start_time", "09:00"))
+    finish_mins = first_start + total_time
+    finish_time = f"{finish_mins // 60:02d}:{finish_mins % 60:02d}"
     
-    return OptimizedRoute(
-        appointments=appt_models,
-        total_estimated_time=total_time,
-        total_distance_estimate=round(total_distance, 1),
-        finish_time_estimate=finish_time
-    )
+    # Returned as plain data so the response model validates each stop once
+    return {
+        "appointments": optimized,
+        "total_estimated_time": total_time,
+        "total_distance_estimate": round(total_distance, 1),
+        "finish_time_estimate": finish_time,
+    }
 
 # === DASHBOARD STATS ===
 @api_router.get("/dashboard/stats")
@@ -607,8 +2128,10 @@ async def get_dashboard_stats(date: Optional[str] = None, user: User = Depends(g
     if date:
         query["date"] = date
     
-    appointments = await db.appointments.find(query, {"_id": 0}).to_list(1000)
-    clients_count = await db.clients.count_documents({"user_id": user.user_id})
+    appointments = await (list_reads(db.appointments).find(query, {"_id": 0})
+                          .max_time_ms(MONGO_MAX_TIME_MS).to_list(1000))
+    clients_count = await list_reads(db.clients).count_documents(
+        {"user_id": user.user_id}, maxTimeMS=MONGO_MAX_TIME_MS)
     
     open_houses = len([a for a in appointments if a.get("is_open_house")])
     private_viewings = len([a for a in appointments if not a.get("is_open_house")])
@@ -636,6 +2159,35 @@ async def health_check():
     except Exception as e:
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
 
+# Prometheus scrape endpoint; set METRICS_TOKEN to require "Authorization: Bearer <token>"
+@api_router.get("/metrics")
+async def get_metrics(request: Request):
+    token = os.environ.get("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# === ADMIN ENDPOINTS ===
+def require_admin(request: Request):
+    """Admin endpoints are disabled unless ADMIN_TOKEN is set and sent as a bearer token"""
+    token = os.environ.get("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not found")
+    if request.headers.get("Authorization") != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+@api_router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_request_profiles():
+    """Slow request profiles currently in the ring buffer, slowest first"""
+    return {"profiles": PROFILES.list()}
+
+@api_router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_request_profile(profile_id: str):
+    profile = PROFILES.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
 # === GEOCODING ENDPOINTS (OpenStreetMap Nominatim) ===
 NOMINATIM_URL = "https://nominatim.openstreetmap.org"
 NOMINATIM_HEADERS = {"User-Agent": "EstateSchedulerPro/1.0"}
@@ -644,7 +2196,7 @@ NOMINATIM_HEADERS = {"User-Agent": "EstateSchedulerPro/1.0"}
 async def search_address(query: str):
     """Search for addresses using Nominatim"""
     try:
-        async with httpx.AsyncClient() as client_http:
+        async with metrics.http_client() as client_http:
             response = await client_http.get(
                 f"{NOMINATIM_URL}/search",
                 params={
@@ -664,41 +2216,80 @@ async def search_address(query: str):
         logger.error(f"Geocode search error: {e}")
         return {"results": []}
 
+async def geocode_address(address: str) -> Optional[dict]:
+    """Look up the best Nominatim match for an address, or None when nothing matches"""
+    async with metrics.http_client() as client_http:
+        response = await client_http.get(
+            f"{NOMINATIM_URL}/search",
+            params={
+                "q": address,
+                "format": "json",
+                "addressdetails": 1,
+                "limit": 1,
+            },
+            headers=NOMINATIM_HEADERS,
+            timeout=10.0
+        )
+        if response.status_code == 200:
+            results = response.json()
+            if results:
+                result = results[0]
+                addr = result.get("address", {})
+                return {
+                    "display_name": result.get("display_name"),
+                    "latitude": float(result.get("lat")),
+                    "longitude": float(result.get("lon")),
+                    "city": addr.get("city") or addr.get("town") or addr.get("village") or "",
+                }
+    return None
+
 @api_router.get("/geocode/validate")
 async def validate_address(address: str):
     """Validate an address and return coordinates"""
     try:
-        async with httpx.AsyncClient() as client_http:
-            response = await client_http.get(
-                f"{NOMINATIM_URL}/search",
-                params={
-                    "q": address,
-                    "format": "json",
-                    "addressdetails": 1,
-                    "limit": 1,
-                },
-                headers=NOMINATIM_HEADERS,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                results = response.json()
-                if results:
-                    result = results[0]
-                    addr = result.get("address", {})
-                    return {
-                        "valid": True,
-                        "result": {
-                            "display_name": result.get("display_name"),
-                            "latitude": float(result.get("lat")),
-                            "longitude": float(result.get("lon")),
-                            "city": addr.get("city") or addr.get("town") or addr.get("village") or "",
-                        }
-                    }
-            return {"valid": False, "result": None}
+        result = await geocode_address(address)
+        if result:
+            return {"valid": True, "result": result}
+        return {"valid": False, "result": None}
     except Exception as e:
         logger.error(f"Geocode validate error: {e}")
         return {"valid": False, "result": None, "error": str(e)}
 
+# === BACKGROUND GEOCODING ===
+# Nominatim's usage policy allows at most one request per second
+GEOCODE_INTERVAL_SECONDS = 1.0
+GEOCODE_QUEUE_SIZE = 10000
+_geocode_queue: Optional[asyncio.Queue] = None
+_geocode_task: Optional[asyncio.Task] = None
+
+def enqueue_geocode(collection_name: str, doc_id: str, address: str) -> bool:
+    """Queue a document for background geocoding; False when the queue is full"""
+    global _geocode_queue, _geocode_task
+    if _geocode_queue is None:
+        _geocode_queue = asyncio.Queue(maxsize=GEOCODE_QUEUE_SIZE)
+    if _geocode_task is None or _geocode_task.done():
+        _geocode_task = asyncio.create_task(geocode_worker())
+    try:
+        _geocode_queue.put_nowait((collection_name, doc_id, address))
+        return True
+    except asyncio.QueueFull:
+        return False
+
+async def geocode_worker():
+    while True:
+        collection_name, doc_id, address = await _geocode_queue.get()
+        try:
+            result = await geocode_address(address)
+            if result:
+                lat, lon = result["latitude"], result["longitude"]
+                await db[collection_name].update_one(
+                    {"id": doc_id, "latitude": None},
+                    versioned({"$set": {"latitude": lat, "longitude": lon, "location": geo_point(lat, lon)}})
+                )
+        except Exception as e:
+            logger.error(f"Background geocode error: {e}")
+        await asyncio.sleep(GEOCODE_INTERVAL_SECONDS)
+
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate distance between two points in miles using Haversine formula"""
     R = 3959  # Earth's radius in miles
@@ -713,7 +2304,262 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     
     return R * c
 
-app.include_router(api_router)
+# === NOTIFICATIONS ===
+# Reminders and daily summaries. One worker at a time holds the scheduler lock in
+# `locks`; deliveries are claimed in `notification_deliveries` under a unique key
+# before sending, so restarts and failovers never send the same notification twice.
+REMINDER_SCAN_SECONDS = int(os.environ.get("REMINDER_SCAN_SECONDS", "60"))  # 0 disables the scheduler
+REMINDER_MAX_LEAD_MINUTES = 120  # longest reminderTime the settings page offers
+REMINDER_RETRY_SECONDS = 60
+REMINDER_MAX_ATTEMPTS = 3
+NOTIFICATION_BATCH_SIZE = 100
+DAILY_SUMMARY_TIME = os.environ.get("DAILY_SUMMARY_TIME", "07:00")  # in each user's time zone
+# start_at holds wall-clock time labelled UTC; it is read in the user's `timezone` setting, else this zone
+DEFAULT_TIMEZONE = os.environ.get("DEFAULT_TIMEZONE", "UTC")
+DEFAULT_ZONE = ZoneInfo(DEFAULT_TIMEZONE)
+DAILY_SUMMARY_GRACE = timedelta(hours=3)
+SCHEDULER_LOCK = "notification-scheduler"
+LOCK_LEASE_SECONDS = 30
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+REMINDER_FIELDS = {"_id": 0, "id": 1, "user_id": 1, "start_at": 1, "date": 1, "start_time": 1,
+                   "end_time": 1, "property_address": 1, "city": 1}
+_notification_task: Optional[asyncio.Task] = None
+
+async def acquire_lock(name: str) -> bool:
+    """Take or renew a leased lock; False while another worker holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.locks.find_one_and_update(
+            {"_id": name, "$or": [{"owner": WORKER_ID}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=LOCK_LEASE_SECONDS)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The lock exists and is held by someone else, so the upsert collided
+        return False
+
+async def release_lock(name: str):
+    await db.locks.delete_one({"_id": name, "owner": WORKER_ID})
+
+def reminder_lead(settings: dict) -> timedelta:
+    try:
+        minutes = int(settings.get("reminderTime", "30"))
+    except (TypeError, ValueError):
+        minutes = 30
+    return timedelta(minutes=max(0, min(minutes, REMINDER_MAX_LEAD_MINUTES)))
+
+def user_zone(settings: dict) -> ZoneInfo:
+    try:
+        return ZoneInfo(settings["timezone"]) if settings.get("timezone") else DEFAULT_ZONE
+    except (ZoneInfoNotFoundError, ValueError):
+        return DEFAULT_ZONE
+
+def wall_clock(instant: datetime, zone: ZoneInfo) -> datetime:
+    """`instant` as wall-clock time in `zone`, labelled UTC the way start_at is stored"""
+    return instant.astimezone(zone).replace(tzinfo=timezone.utc)
+
+def instant_of(wall: datetime, zone: ZoneInfo) -> datetime:
+    """The real moment a stored wall-clock time denotes in `zone`"""
+    return wall.replace(tzinfo=zone).astimezone(timezone.utc)
+
+async def timezone_groups() -> List[tuple]:
+    """(zone, user filter) pairs covering every user once: one per explicit zone, the rest in DEFAULT_ZONE"""
+    explicit = await db.user_settings.find(
+        {"timezone": {"$nin": [None, DEFAULT_TIMEZONE]}}, {"_id": 0, "user_id": 1, "timezone": 1}
+    ).to_list(None)
+    by_zone = {}
+    for s in explicit:
+        zone = user_zone(s)
+        if zone is not DEFAULT_ZONE:
+            by_zone.setdefault(zone, []).append(s["user_id"])
+    others = [user_id for user_ids in by_zone.values() for user_id in user_ids]
+    groups = [(zone, {"user_id": {"$in": user_ids}}) for zone, user_ids in by_zone.items()]
+    groups.append((DEFAULT_ZONE, {"user_id": {"$nin": others}} if others else {}))
+    return groups
+
+async def settings_for(user_ids) -> dict:
+    found = await db.user_settings.find({"user_id": {"$in": list(user_ids)}}, {"_id": 0}).to_list(None)
+    defaults = UserSettings().model_dump()
+    settings = {user_id: defaults for user_id in user_ids}
+    settings.update({s["user_id"]: {**defaults, **s} for s in found})
+    return settings
+
+class NotificationScheduler:
+    """Leader-only loop: scan for upcoming work into a timer heap, deliver what is due in batches"""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.timers = TimerHeap()
+        self._leader = False
+        self._scanned_until: Optional[datetime] = None
+        self._last_scan: Optional[datetime] = None
+
+    async def run(self):
+        renew = LOCK_LEASE_SECONDS / 3
+        while True:
+            wait = renew
+            try:
+                if not await acquire_lock(SCHEDULER_LOCK):
+                    if self._leader:
+                        logger.info("Lost notification scheduler lock")
+                        self._leader = False
+                        self.timers.clear()
+                        self._scanned_until = self._last_scan = None
+                    await asyncio.sleep(renew)
+                    continue
+                self._leader = True
+                now = datetime.now(timezone.utc)
+                if self._last_scan is None or (now - self._last_scan).total_seconds() >= REMINDER_SCAN_SECONDS:
+                    await self.scan(now)
+                await self.deliver_due(now)
+                next_scan = self._last_scan + timedelta(seconds=REMINDER_SCAN_SECONDS)
+                next_due = min(filter(None, [self.timers.next_due(), next_scan]))
+                wait = min(renew, max(0.5, (next_due - datetime.now(timezone.utc)).total_seconds()))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification scheduler error: {e}")
+            await asyncio.sleep(wait)
+
+    async def scan(self, now: datetime):
+        """Arm timers for reminders whose appointments start within the lead horizon and for summaries"""
+        horizon = now + timedelta(minutes=REMINDER_MAX_LEAD_MINUTES, seconds=REMINDER_SCAN_SECONDS)
+        # Each scan reads only the newly reached slice of time, plus appointments written
+        # since the last scan that now start inside the already-read slice. The slices are
+        # real time, so each time zone's users are queried with their own wall-clock bounds.
+        appointments = []
+        for zone, users in await timezone_groups():
+            window = {"start_at": {"$gte": wall_clock(self._scanned_until or now, zone),
+                                   "$lt": wall_clock(horizon, zone)}}
+            query = {**users, **window}
+            if self._scanned_until:
+                query = {**users, "$or": [window, {
+                    "start_at": {"$gte": wall_clock(now, zone), "$lt": wall_clock(self._scanned_until, zone)},
+                    "updated_at": {"$gte": self._last_scan.isoformat()},
+                }]}
+            appointments += await db.appointments.find(query, REMINDER_FIELDS).to_list(None)
+        self._scanned_until, self._last_scan = horizon, now
+
+        settings = await settings_for({a["user_id"] for a in appointments})
+        for appt in appointments:
+            user_settings = settings[appt["user_id"]]
+            if not (user_settings["emailNotifications"] and user_settings["appointmentReminders"]):
+                continue
+            starts = instant_of(appt["start_at"], user_zone(user_settings))
+            self.timers.push(Notification(
+                f"reminder:{appt['id']}:{starts.isoformat()}",
+                starts - reminder_lead(user_settings), "reminder", appt["user_id"], {**appt, "starts": starts},
+            ))
+
+        hour, minute = (int(part) for part in DAILY_SUMMARY_TIME.split(":"))
+        summaries = await db.user_settings.find(
+            {"dailySummary": True, "emailNotifications": {"$ne": False}}, {"_id": 0, "user_id": 1, "timezone": 1}
+        ).to_list(None)
+        for s in summaries:
+            zone = user_zone(s)
+            today = now.astimezone(zone).date()
+            for day in (today, today + timedelta(days=1)):
+                due = datetime(day.year, day.month, day.day, hour, minute, tzinfo=zone).astimezone(timezone.utc)
+                if due + DAILY_SUMMARY_GRACE < now:
+                    continue
+                self.timers.push(Notification(
+                    f"summary:{s['user_id']}:{day.isoformat()}", due, "summary", s["user_id"], {"date": day.isoformat()},
+                ))
+        self.timers.prune(now - timedelta(days=1))
+
+    async def deliver_due(self, now: datetime):
+        while True:
+            due = self.timers.pop_due(now, NOTIFICATION_BATCH_SIZE)
+            if not due:
+                return
+            messages = await self.render(due)
+            claimed = await self.claim(messages, now)
+            if not claimed:
+                continue
+            try:
+                failed = set(await self.sink.send(claimed))
+            except Exception as e:
+                logger.error(f"Notification sink error: {e}")
+                failed = {m.key for m in claimed}
+            sent = [m.key for m in claimed if m.key not in failed]
+            if sent:
+                await db.notification_deliveries.update_many(
+                    {"_id": {"$in": sent}}, {"$set": {"status": "sent", "sent_at": datetime.now(timezone.utc)}}
+                )
+            if failed:
+                await self.retry([n for n in due if n.key in failed])
+
+    async def retry(self, notifications: List[Notification]):
+        """Release failed claims and re-arm them, up to REMINDER_MAX_ATTEMPTS"""
+        await db.notification_deliveries.delete_many({"_id": {"$in": [n.key for n in notifications]}})
+        for notification in notifications:
+            notification.attempts += 1
+            if notification.attempts >= REMINDER_MAX_ATTEMPTS:
+                logger.error(f"Giving up on notification {notification.key}")
+                continue
+            notification.due = datetime.now(timezone.utc) + timedelta(seconds=REMINDER_RETRY_SECONDS)
+            self.timers.push(notification, rearm=True)
+
+    async def claim(self, messages: List[Message], now: datetime) -> List[Message]:
+        """Insert delivery records; messages whose key already exists were sent before"""
+        if not messages:
+            return []
+        duplicates = set()
+        try:
+            await db.notification_deliveries.insert_many(
+                [{"_id": m.key, "to": m.to, "status": "sending", "created_at": now} for m in messages], ordered=False
+            )
+        except BulkWriteError as e:
+            duplicates = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") == 11000}
+        return [m for i, m in enumerate(messages) if i not in duplicates]
+
+    async def render(self, due: List[Notification]) -> List[Message]:
+        """Build messages, dropping reminders for appointments since moved or deleted"""
+        user_ids = {n.user_id for n in due}
+        users = {u["user_id"]: u for u in await db.users.find(
+            {"user_id": {"$in": list(user_ids)}}, {"_id": 0, "user_id": 1, "email": 1, "name": 1, "is_guest": 1}
+        ).to_list(None)}
+        settings = await settings_for(user_ids)
+        reminder_ids = [n.payload["id"] for n in due if n.kind == "reminder"]
+        current = {a["id"]: a for a in await db.appointments.find(
+            {"id": {"$in": reminder_ids}}, REMINDER_FIELDS
+        ).to_list(None)} if reminder_ids else {}
+
+        messages = []
+        for notification in due:
+            user = users.get(notification.user_id)
+            user_settings = settings[notification.user_id]
+            # Guest accounts have placeholder addresses
+            if not user or user.get("is_guest") or not user_settings["emailNotifications"]:
+                continue
+            if notification.kind == "reminder":
+                appt = current.get(notification.payload["id"])
+                # Moved, deleted, or the user changed time zone since the timer was armed
+                if (not appt or not user_settings["appointmentReminders"] or not appt.get("start_at")
+                        or instant_of(appt["start_at"], user_zone(user_settings)) != notification.payload["starts"]):
+                    continue
+                subject = f"Reminder: {appt['property_address']} at {appt['start_time']}"
+                body = (f"Hi {user.get('name', '')},\n\nYou have a viewing at {appt['property_address']}, "
+                        f"{appt.get('city', '')} on {appt['date']} from {appt['start_time']} to {appt.get('end_time', '')}.")
+            else:
+                if not user_settings["dailySummary"]:
+                    continue
+                subject, body = await self.daily_summary(user, notification.payload["date"])
+            messages.append(Message(notification.key, user["email"], subject, body))
+        return messages
+
+    async def daily_summary(self, user: dict, date: str) -> tuple:
+        start = parse_range_bound(date, end=False)
+        appointments = await db.appointments.find(
+            {"user_id": user["user_id"], "start_at": {"$gte": start, "$lt": start + timedelta(days=1)}}, REMINDER_FIELDS
+        ).sort("start_at", 1).to_list(None)
+        if not appointments:
+            return f"Your schedule for {date}", f"Hi {user.get('name', '')},\n\nNo appointments are booked for {date}."
+        lines = [f"  {a['start_time']}-{a.get('end_time', '')}  {a['property_address']}, {a.get('city', '')}"
+                 for a in appointments]
+        return (f"Your schedule for {date}: {len(appointments)} appointments",
+                f"Hi {user.get('name', '')},\n\nToday's appointments:\n" + "\n".join(lines))
 
 # Get allowed origins - for production, use specific domains
 cors_origins = os.environ.get('CORS_ORIGINS', '*')
@@ -727,20 +2573,190 @@ if cors_origins == '*':
 else:
     allowed_origins = cors_origins.split(',')
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=allowed_origins,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+# (collection name, keys, options) created at startup; each is attempted independently
+INDEXES = [
+    ("users", [("user_id", 1)], {}),
+    ("users", [("email", 1)], {"unique": True}),
+    ("user_sessions", [("session_token", 1)], {}),
+    ("user_sessions", [("user_id", 1)], {}),
+    ("appointments", [("location", "2dsphere"), ("user_id", 1)], {}),
+    ("clients", [("location", "2dsphere"), ("user_id", 1)], {}),
+    ("clients", [("user_id", 1), ("id", 1)], {}),
+    ("appointments", [("user_id", 1), ("id", 1)], {}),
+    ("house_notes", [("user_id", 1), ("id", 1)], {}),
+    ("clients", [("user_id", 1), ("updated_at", 1), ("id", 1)], {}),
+    ("appointments", [("user_id", 1), ("updated_at", 1), ("id", 1)], {}),
+    ("house_notes", [("user_id", 1), ("updated_at", 1), ("id", 1)], {}),
+    ("appointments", [("user_id", 1), ("start_at", 1)], {}),
+    ("tombstones", [("user_id", 1), ("deleted_at", 1), ("id", 1)], {}),
+    ("tombstones", [("expires_at", 1)], {"expireAfterSeconds": 0}),
+    ("appointments", [("start_at", 1)], {}),
+    ("user_settings", [("dailySummary", 1)], {"partialFilterExpression": {"dailySummary": True}}),
+    ("notification_deliveries", [("created_at", 1)], {"expireAfterSeconds": 30 * 24 * 60 * 60}),
+    # X-Import-Id is chosen by the client, so ids are only unique per user
+    ("import_jobs", [("user_id", 1), ("id", 1)], {"unique": True}),
+    # One text index per collection; the user_id prefix keeps each search to one user's keys
+    ("clients", [("user_id", 1), ("name", "text"), ("email", "text"), ("phone", "text")],
+     {"name": "search_text", "weights": {"name": 10, "email": 5, "phone": 5}, "default_language": "none"}),
+    ("appointments", [("user_id", 1), ("property_address", "text"), ("city", "text")],
+     {"name": "search_text", "weights": {"property_address": 5, "city": 2}, "default_language": "none"}),
+    ("house_notes", [("user_id", 1), ("notes", "text")],
+     {"name": "search_text", "default_language": "english"}),
+]
+
+_index_task: Optional[asyncio.Task] = None
+
+def index_required(keys: list) -> bool:
+    """$text and $geoNear fail outright without their index; the others only speed queries up"""
+    return any(direction in ("text", "2dsphere") for _, direction in keys)
+
+async def create_indexes(required: bool):
+    for collection_name, keys, options in INDEXES:
+        if index_required(keys) != required:
+            continue
+        try:
+            await db[collection_name].create_index(keys, **options)
+        except Exception as e:
+            logger.error(f"Index setup error on {collection_name} {keys}: {e}")
+
+async def ensure_indexes():
+    """Backfill derived fields the query endpoints rely on, then build the optional indexes"""
+    try:
+        for collection in (db.appointments, db.clients):
+            # Backfill GeoJSON points for documents written before `location` existed
+            await collection.update_many(
+                {
+                    "location": {"$exists": False},
+                    "latitude": {"$type": "number"},
+                    "longitude": {"$type": "number"},
+                },
+                [{"$set": {"location": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}]
+            )
+        for collection in (db.clients, db.appointments, db.house_notes):
+            # Documents written before optimistic concurrency start at version 1
+            await collection.update_many(
+                {"$or": [{"version": {"$exists": False}}, {"updated_at": {"$exists": False}}]},
+                [{"$set": {
+                    "version": {"$ifNull": ["$version", 1]},
+                    "updated_at": {"$ifNull": ["$updated_at", "$created_at"]},
+                }}]
+            )
+        # Derive start_at/end_at from the date and time strings; unparseable values stay null
+        def parse_time(field):
+            return {"$dateFromString": {
+                "dateString": {"$concat": ["$date", "T", f"${field}"]},
+                "format": "%Y-%m-%dT%H:%M", "timezone": "UTC", "onError": None, "onNull": None,
+            }}
+        await db.appointments.update_many(
+            {"start_at": {"$exists": False}, "date": {"$type": "string"}},
+            [
+                {"$set": {"start_at": parse_time("start_time"), "end_at": parse_time("end_time")}},
+                {"$set": {"end_at": {"$cond": [
+                    {"$and": ["$start_at", "$end_at", {"$lt": ["$end_at", "$start_at"]}]},
+                    {"$add": ["$end_at", 24 * 60 * 60 * 1000]},
+                    "$end_at",
+                ]}}},
+            ]
+        )
+    except Exception as e:
+        logger.error(f"Backfill error: {e}")
+    await create_indexes(required=False)
+
+async def start_index_setup():
+    """Build the text and 2dsphere indexes before serving; backfills and other indexes run beside traffic.
+
+    Creating an index that already exists is a quick no-op, so only a fresh database waits here.
+    Until the backfills finish, documents written before `location` or `start_at` existed are
+    missed by the near and date-range queries.
+    """
+    global _index_task
+    await create_indexes(required=True)
+    _index_task = asyncio.create_task(ensure_indexes())
+
+async def warm_up_db():
+    """Select a server and open the first pooled connection before the first request needs one"""
+    try:
+        await db.command("ping")
+    except Exception as e:
+        logger.error(f"MongoDB warm-up ping failed: {e}")
+
+def start_orphan_sweeper():
+    global _orphan_sweep_task
+    if ORPHAN_SWEEP_INTERVAL_SECONDS > 0:
+        _orphan_sweep_task = asyncio.create_task(orphan_sweeper())
+
+def start_notification_scheduler():
+    global _notification_task
+    if REMINDER_SCAN_SECONDS > 0:
+        _notification_task = asyncio.create_task(NotificationScheduler(sink_from_env()).run())
+
+async def start_cache_invalidation():
+    """Each worker caches on its own; the bus tells the others when a cached document changes"""
+    try:
+        if REDIS_URL:
+            USER_CACHE.bus = RedisInvalidationBus(REDIS_URL, USER_CACHE, WORKER_ID)
+        else:
+            USER_CACHE.bus = MongoInvalidationBus(db, USER_CACHE, WORKER_ID)
+        await USER_CACHE.bus.start()
+    except Exception as e:
+        logger.error(f"Cache invalidation unavailable: {e}")
+        USER_CACHE.bus = None
+
 async def shutdown_db_client():
-    client.close()
+    if USER_CACHE.bus is not None:
+        await USER_CACHE.bus.stop()
+    for task in (_index_task, _geocode_task, _orphan_sweep_task, _notification_task):
+        if task:
+            task.cancel()
+    for task, lock in ((_notification_task, SCHEDULER_LOCK), (_orphan_sweep_task, ORPHAN_SWEEP_LOCK)):
+        if task:
+            try:
+                await release_lock(lock)
+            except Exception as e:
+                logger.error(f"Lock release error: {e}")
+    change_hub.stop()
+    if client is not None:
+        client.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_db()
+    await warm_up_db()
+    await start_index_setup()
+    start_orphan_sweeper()
+    start_notification_scheduler()
+    await start_cache_invalidation()
+    yield
+    await shutdown_db_client()
+
+async def database_timeout_handler(request: Request, exc: Exception):
+    logger.warning(f"Database timeout on {request.method} {request.url.path}: {exc}")
+    return ORJSONResponse({"detail": "Database unavailable, please retry"}, status_code=503, headers={"Retry-After": "1"})
+
+def create_app() -> FastAPI:
+    """Build the ASGI app; each worker process (`uvicorn --workers N`) builds its own"""
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+    app.include_router(api_router)
+    for timeout in (ExecutionTimeout, NetworkTimeout, ServerSelectionTimeoutError, WaitQueueTimeoutError):
+        app.add_exception_handler(timeout, database_timeout_handler)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=allowed_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    # Cache headers sit inside compression so ETags and 304s are decided on the uncompressed body
+    app.add_middleware(CacheHeadersMiddleware)
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(ProfilingMiddleware)
+    app.add_middleware(PrometheusMiddleware)
+    return app
+
+app = create_app()
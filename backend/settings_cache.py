@@ -0,0 +1,189 @@
+"""Per-user cache for small, rarely written documents (user settings, route priorities).
+
+`UserDocCache` keeps documents in process, keyed by (kind, user_id). Writes go
+through it: the endpoint that saves a document stores the new version in the
+cache and publishes an invalidation so other workers drop their copy. A TTL
+bounds staleness if an invalidation is ever missed.
+
+Invalidations travel over a bus so caches stay correct with several workers.
+`MongoInvalidationBus` appends them to a small capped collection that every
+worker tails, and needs nothing beyond MongoDB. `RedisInvalidationBus` uses
+Redis pub/sub instead when REDIS_URL is set and the `redis` package is
+installed; a local `redis-server` is enough for development.
+
+Cached documents are shared between requests and must be treated as read-only.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "estate:user-cache"
+
+
+class UserDocCache:
+    def __init__(self, ttl_seconds: float = 300, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.bus = None
+        # (kind, user_id) -> (expires at, document or None)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # Bumped on every write or invalidation so a load that raced one is not stored
+        self._generations = {}
+
+    async def get(self, kind: str, user_id: str, loader: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        key = (kind, user_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry[1]
+        generation = self._generations.get(key, 0)
+        doc = await loader()
+        if self._generations.get(key, 0) == generation:
+            self._store(key, doc)
+        return doc
+
+    def _store(self, key: tuple, doc: Optional[dict]):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, doc)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._generations.pop(evicted, None)
+
+    def _bump(self, key: tuple):
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        for key in self._entries:
+            self._bump(key)
+        self._entries.clear()
+
+    def invalidate(self, kind: str, user_id: str):
+        key = (kind, user_id)
+        self._bump(key)
+        self._entries.pop(key, None)
+
+    async def write(self, kind: str, user_id: str, doc: dict):
+        """Store a freshly saved document and tell other workers to drop theirs"""
+        key = (kind, user_id)
+        self._bump(key)
+        self._store(key, doc)
+        if self.bus is not None:
+            try:
+                await self.bus.publish(kind, user_id)
+            except Exception as e:
+                logger.error(f"Cache invalidation publish failed: {e}")
+
+
+class RedisInvalidationBus:
+    """Redis pub/sub fan-out of cache invalidations between workers"""
+
+    def __init__(self, url: str, cache: UserDocCache, origin: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._cache = cache
+        self._origin = origin
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        await self._redis.aclose()
+
+    async def publish(self, kind: str, user_id: str):
+        message = json.dumps({"kind": kind, "user_id": user_id, "origin": self._origin})
+        await self._redis.publish(INVALIDATION_CHANNEL, message)
+
+    async def _listen(self):
+        backoff = 1
+        subscribed_before = False
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    if subscribed_before:
+                        # Invalidations sent while disconnected were lost
+                        self._cache.clear()
+                    subscribed_before = True
+                    backoff = 1
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        data = json.loads(message["data"])
+                        if data.get("origin") != self._origin:
+                            self._cache.invalidate(data["kind"], data["user_id"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation listener error: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+class MongoInvalidationBus:
+    """Cache invalidations through a capped collection tailed by every worker.
+
+    Each worker reads the whole collection when its tail starts. Replaying old
+    invalidations is harmless, so no resume position is kept. If the cursor is
+    lost, for example because the collection wrapped past it, the local cache
+    is cleared before tailing again.
+    """
+
+    def __init__(self, database, cache: UserDocCache, origin: str,
+                 collection: str = "cache_invalidations", size_bytes: int = 1 << 20, max_documents: int = 1000):
+        self._database = database
+        self._collection_name = collection
+        self._size_bytes = size_bytes
+        self._max_documents = max_documents
+        self._cache = cache
+        self._origin = origin
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        try:
+            await self._database.create_collection(
+                self._collection_name, capped=True, size=self._size_bytes, max=self._max_documents)
+        except CollectionInvalid:
+            pass  # already created by another worker
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def publish(self, kind: str, user_id: str):
+        await self._database[self._collection_name].insert_one({
+            "kind": kind, "user_id": user_id, "origin": self._origin, "at": datetime.now(timezone.utc),
+        })
+
+    async def _listen(self):
+        collection = self._database[self._collection_name]
+        tailed_before = False
+        while True:
+            try:
+                cursor = collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+                if tailed_before:
+                    self._cache.clear()
+                while cursor.alive:
+                    async for doc in cursor:
+                        tailed_before = True
+                        if doc.get("origin") != self._origin:
+                            self._cache.invalidate(doc["kind"], doc["user_id"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation tail error: {e}")
+            # An empty capped collection yields a dead cursor straight away
+            await asyncio.sleep(1)
@@ -114,13 +114,18 @@ export default function AppointmentsPage() {
   const handleSubmit = async (e) => {
     e.preventDefault();
     try {
+      let response;
       if (editingAppt) {
-        await apiClient.put(`/appointments/${editingAppt.id}`, formData);
+        response = await apiClient.put(`/appointments/${editingAppt.id}`, formData);
         toast.success("Appointment updated");
       } else {
-        await apiClient.post(`/appointments`, formData);
+        response = await apiClient.post(`/appointments`, formData);
         toast.success("Appointment created");
       }
+      const conflicts = response.data?.conflicts || [];
+      if (conflicts.length > 0) {
+        toast.warning(`This booking overlaps or leaves too little travel time for ${conflicts.length} other appointment(s)`);
+      }
       handleCloseDialog();
       fetchData();
     } catch (error) {
@@ -44,6 +44,9 @@ export default function SettingsPage() {
     
     // Theme
     theme: "light",
+
+    // Reminder and summary times are read in this zone
+    timezone: Intl.DateTimeFormat().resolvedOptions().timeZone,
   });
 
   useEffect(() => {
@@ -86,7 +89,7 @@ export default function SettingsPage() {
         withCredentials: true,
       });
       if (res.data) {
-        setSettings((prev) => ({ ...prev, ...res.data }));
+        setSettings((prev) => ({ ...prev, ...res.data, timezone: res.data.timezone || prev.timezone }));
       }
     } catch (error) {
       // Settings not found, use defaults
@@ -306,7 +309,9 @@ export default function SettingsPage() {
               <Clock className="text-[#D3AF37]" size={20} />
               Default Working Hours
             </CardTitle>
-            <CardDescription>Set your typical availability</CardDescription>
+            <CardDescription>
+              Set your typical availability. Times are in {settings.timezone}.
+            </CardDescription>
           </CardHeader>
           <CardContent className="space-y-4">
             <div className="grid grid-cols-2 gap-4">
@@ -0,0 +1,37 @@
+import asyncio
+
+import httpx
+import pytest
+
+import server
+
+
+def test_dependency_overrides_reach_api_routes():
+    app = server.create_app()
+    app.dependency_overrides[server.get_current_user] = lambda: server.User(
+        user_id="u1", email="agent@example.com", name="Agent")
+
+    async def get_me():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.get("/api/auth/me")
+
+    response = asyncio.run(get_me())
+    assert response.status_code == 200
+    assert response.json()["email"] == "agent@example.com"
+
+
+def test_query_indexes_exist_before_startup_returns(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = mongomock_motor.AsyncMongoMockClient()["startup_test"]
+    monkeypatch.setattr(server, "db", database)
+
+    async def start():
+        await server.start_index_setup()
+        server._index_task.cancel()
+        return {name: await database[name].index_information() for name in ("clients", "appointments", "house_notes")}
+
+    indexes = asyncio.run(start())
+    assert all("search_text" in names for names in indexes.values())
+    assert "location_2dsphere_user_id_1" in indexes["clients"]
+    assert "location_2dsphere_user_id_1" in indexes["appointments"]
@@ -0,0 +1,48 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+USER = server.User(user_id="u1", email="u1@example.com", name="U1")
+EVERY_DAY = server.WEEKDAYS
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["availability_test"]
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "USER_CACHE", server.UserDocCache())
+    return database
+
+
+def availability(database, date: str, settings: dict, appointments=()) -> list:
+    async def run():
+        await database.user_settings.insert_one({"user_id": "u1", "workDays": EVERY_DAY, **settings})
+        for appt in appointments:
+            await database.appointments.insert_one({"user_id": "u1", **server.with_schedule(dict(appt))})
+        return await server.get_availability(
+            date_from=date, date_to=None, duration=60, address=None, latitude=None, longitude=None,
+            limit=200, user=USER
+        )
+    return asyncio.run(run())
+
+
+def test_bookings_running_past_midnight_block_the_next_morning(database):
+    day = datetime.now(timezone.utc).date() + timedelta(days=30)
+    slots = availability(database, day.isoformat(), {"workStartTime": "00:00", "workEndTime": "04:00"}, [
+        {"id": "late", "date": (day - timedelta(days=1)).isoformat(), "start_time": "22:00", "end_time": "02:00"},
+    ])
+    assert [(s.start_time, s.end_time) for s in slots] == [("02:00", "03:00")]
+
+
+def test_today_starts_at_the_current_time_in_the_user_zone(database):
+    zone = "Pacific/Kiritimati"  # UTC+14, so its date and clock differ from UTC most of the day
+    now = datetime.now(timezone.utc).astimezone(server.ZoneInfo(zone))
+    slots = availability(database, now.date().isoformat(),
+                         {"timezone": zone, "workStartTime": "00:00", "workEndTime": "23:59"})
+    earliest = (now - timedelta(minutes=1)).strftime("%H:%M")
+    assert all(slot.date == now.date().isoformat() and slot.start_time >= earliest for slot in slots)
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+class ChunkedRequest:
+    def __init__(self, *chunks: bytes):
+        self.chunks = chunks
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def elements(*chunks: bytes) -> list:
+    async def run():
+        return [item async for item in server.iter_json_array(ChunkedRequest(*chunks))]
+    return asyncio.run(run())
+
+
+def test_elements_stream_across_chunks():
+    assert elements(b' [{"a": 1}', b' , {"b"', b': 2}, 12', b"3, []]") == [{"a": 1}, {"b": 2}, 123, []]
+    assert elements(b"[", b" ]") == []
+
+
+@pytest.mark.parametrize("body", [
+    b'[{"a": 1} {"b": 2}]',
+    b'[,,{"a": 1}]',
+    b'[{"a": 1},,{"b": 2}]',
+    b'[{"a": 1},]',
+    b'[,]',
+    b'{"a": 1}',
+    b'[{"a": 1}',
+])
+def test_malformed_arrays_are_rejected(body):
+    with pytest.raises(server.HTTPException) as error:
+        elements(body)
+    assert error.value.status_code == 400
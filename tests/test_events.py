@@ -0,0 +1,28 @@
+import asyncio
+
+import server
+
+
+class ConnectedRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def test_connection_is_only_counted_while_streaming(monkeypatch):
+    hub = server.ChangeHub()
+    hub.available = False  # no change stream task to start
+    monkeypatch.setattr(server, "change_hub", hub)
+    user = server.User(user_id="u1", email="u1@example.com", name="U1")
+
+    async def run():
+        # A client that goes away before the body starts never holds a slot
+        await server.live_events(ConnectedRequest(), user)
+        assert hub.connections("u1") == 0
+
+        body = (await server.live_events(ConnectedRequest(), user)).body_iterator
+        assert (await body.__anext__()).startswith("retry:")
+        assert hub.connections("u1") == 1
+        assert "unavailable" in await body.__anext__()
+        await body.aclose()
+        assert hub.connections("u1") == 0
+    asyncio.run(run())
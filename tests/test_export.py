@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+import server
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def collect(records) -> list:
+    async def run():
+        return [(section, key) async for section, key, _, _ in records]
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def seeded(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["export_test"]
+    monkeypatch.setattr(server, "db", database)
+
+    async def seed():
+        await database.clients.insert_many([{"id": f"c{i}", "user_id": "u1", "name": f"C{i}"} for i in range(3)])
+        await database.house_notes.insert_one({"id": "n1", "user_id": "u1", "notes": "roof"})
+        await database.user_settings.insert_one({"user_id": "u1", "theme": "dark"})
+        await database.route_priorities.insert_one({"user_id": "u1", "priorities": []})
+    asyncio.run(seed())
+
+
+def test_resuming_from_any_record_returns_the_rest(seeded):
+    sections = list(server.EXPORT_SECTIONS)
+    everything = collect(server.iter_export_records("u1", sections, None))
+    assert everything[-2:] == [("settings", "user_settings"), ("settings", "route_priorities")]
+    for position, (section, key) in enumerate(everything):
+        cursor = server.encode_export_cursor(section, key)
+        assert collect(server.iter_export_records("u1", sections, cursor)) == everything[position + 1:]
+
+
+def test_unknown_settings_cursor_is_rejected():
+    with pytest.raises(server.HTTPException) as error:
+        server.decode_export_cursor(server.encode_export_cursor("settings", "users"))
+    assert error.value.status_code == 400
+
+
+def test_cursor_outside_the_requested_sections_is_rejected():
+    cursor = server.encode_export_cursor("notes", "n1")
+    with pytest.raises(server.HTTPException) as error:
+        server.decode_export_cursor(cursor, ["clients", "appointments"])
+    assert error.value.status_code == 400
+    assert server.decode_export_cursor(cursor, ["notes"]) == ("notes", "n1")
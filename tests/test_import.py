@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+class ChunkedRequest:
+    """Stands in for a Starlette request whose body arrives in the given chunks"""
+
+    def __init__(self, *chunks: bytes, headers: dict = None, error: Exception = None):
+        self.chunks = chunks
+        self.headers = headers or {}
+        self.error = error
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+        if self.error:
+            raise self.error
+
+
+def collect(rows) -> list:
+    async def run():
+        return [row async for row in rows]
+    return asyncio.run(run())
+
+
+def test_lines_survive_chunk_boundaries_and_split_utf8():
+    body = "name\r\nZoë\nlast".encode()
+    split = body.index("ë".encode()) + 1  # between the two bytes of ë
+    request = ChunkedRequest(b"\xef\xbb\xbf" + body[:3], body[3:split], body[split:])
+    assert collect(server.iter_lines(request)) == ["name\r\n", "Zoë\n", "last"]
+
+
+def test_csv_quoted_fields_may_span_lines_and_chunks():
+    request = ChunkedRequest(b'name, notes\n"Smith, Jo","line one\n', b'line ""two"""\n\n', b"Lee,plain")
+    assert collect(server.iter_csv_rows(request)) == [
+        {"name": "Smith, Jo", "notes": 'line one\nline "two"'},
+        {"name": "Lee", "notes": "plain"},
+    ]
+
+
+def test_csv_unterminated_quote_is_rejected():
+    with pytest.raises(server.HTTPException) as error:
+        collect(server.iter_csv_rows(ChunkedRequest(b'name\n"Smith\n', b"Jo\n")))
+    assert error.value.status_code == 400
+
+
+def test_ndjson_reports_bad_rows_in_place():
+    rows = collect(server.iter_ndjson_rows(ChunkedRequest(b'{"name": "A"}\n{"na', b'me": \n\n[1]\n{"name": "B"}')))
+    assert rows[0] == {"name": "A"}
+    assert isinstance(rows[1], ValueError) and rows[2] == [1] and rows[3] == {"name": "B"}
+
+
+class TestImportJobs:
+    @pytest.fixture(autouse=True)
+    def database(self, monkeypatch):
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        database = mongomock_motor.AsyncMongoMockClient()["import_test"]
+        monkeypatch.setattr(server, "db", database)
+
+        async def setup():
+            await database.import_jobs.create_index([("user_id", 1), ("id", 1)], unique=True)
+        asyncio.run(setup())
+        self.db = database
+
+    @staticmethod
+    def user(user_id: str) -> server.User:
+        return server.User(user_id=user_id, email=f"{user_id}@example.com", name=user_id)
+
+    def run_import(self, request, user_id="u1"):
+        return asyncio.run(server.import_records(
+            server.ImportKind.CLIENTS, request, server.ImportFormat.NDJSON, geocode=False, user=self.user(user_id)
+        ))
+
+    def test_import_ids_are_scoped_to_the_user(self):
+        headers = {"X-Import-Id": "batch-1"}
+        assert self.run_import(ChunkedRequest(b"", headers=headers))["status"] == "completed"
+        with pytest.raises(server.HTTPException) as error:
+            self.run_import(ChunkedRequest(b"", headers=headers))
+        assert error.value.status_code == 409
+        # Another user may pick the same id without touching the first user's job
+        self.run_import(ChunkedRequest(b"", headers=headers), user_id="u2")
+        owners = asyncio.run(self.db.import_jobs.distinct("user_id", {"id": "batch-1"}))
+        assert sorted(owners) == ["u1", "u2"]
+
+    def test_unexpected_errors_mark_the_job_failed(self):
+        request = ChunkedRequest(b"", headers={"X-Import-Id": "cut-off"}, error=ConnectionError("client went away"))
+        with pytest.raises(ConnectionError):
+            self.run_import(request)
+        job = asyncio.run(server.get_import_job("cut-off", self.user("u1")))
+        assert job["status"] == "failed" and job["error"] == "Import interrupted"
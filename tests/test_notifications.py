@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["notifications_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def armed(database, now: datetime, settings: dict) -> dict:
+    """Notification key -> due time after one scan at `now`"""
+    async def run():
+        await database.user_settings.insert_one({"user_id": "u1", "dailySummary": True, **settings})
+        # A 10:00 viewing, stored as wall-clock time the way with_schedule writes it
+        await database.appointments.insert_one({
+            "id": "a1", "user_id": "u1", "date": "2026-03-02", "start_time": "10:00", "end_time": "11:00",
+            "property_address": "1 Elm St", "start_at": datetime(2026, 3, 2, 10, 0, tzinfo=timezone.utc),
+        })
+        scheduler = server.NotificationScheduler(sink=None)
+        await scheduler.scan(now)
+        due = scheduler.timers.pop_due(datetime.max.replace(tzinfo=timezone.utc), 100)
+        return {n.key.split(":")[0] if n.kind == "reminder" else n.key: n.due for n in due}
+    return asyncio.run(run())
+
+
+def test_reminders_and_summaries_follow_the_user_time_zone(database):
+    # 13:00 UTC is 08:00 in New York; the viewing starts at 15:00 UTC
+    due = armed(database, datetime(2026, 3, 2, 13, 0, tzinfo=timezone.utc), {"timezone": "America/New_York"})
+    assert due["reminder"] == datetime(2026, 3, 2, 14, 30, tzinfo=timezone.utc)
+    assert due["summary:u1:2026-03-03"] == datetime(2026, 3, 3, 12, 0, tzinfo=timezone.utc)
+    # Today's 07:00 summary was due an hour ago and is still within the grace period
+    assert due["summary:u1:2026-03-02"] == datetime(2026, 3, 2, 12, 0, tzinfo=timezone.utc)
+
+
+def test_users_without_a_time_zone_use_the_default(database):
+    due = armed(database, datetime(2026, 3, 2, 9, 0, tzinfo=timezone.utc), {})
+    assert due["reminder"] == datetime(2026, 3, 2, 9, 30, tzinfo=timezone.utc)
+
+
+def test_unknown_time_zone_is_rejected():
+    with pytest.raises(ValueError):
+        server.UserSettings(timezone="Mars/Olympus_Mons")
+    assert server.UserSettings(timezone="").timezone is None
+
+
+class CollectingSink:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, messages):
+        self.sent.extend(messages)
+        return []
+
+
+def test_reminder_is_skipped_after_a_time_zone_change(database):
+    async def run(change_zone: bool):
+        await database.users.insert_one({"user_id": "u1", "email": "agent@example.com", "name": "Agent"})
+        await database.user_settings.insert_one({"user_id": "u1", "timezone": "America/New_York"})
+        await database.appointments.insert_one({
+            "id": "a1", "user_id": "u1", "date": "2026-03-02", "start_time": "10:00", "end_time": "11:00",
+            "property_address": "1 Elm St", "start_at": datetime(2026, 3, 2, 10, 0, tzinfo=timezone.utc),
+        })
+        sink = CollectingSink()
+        scheduler = server.NotificationScheduler(sink)
+        await scheduler.scan(datetime(2026, 3, 2, 13, 0, tzinfo=timezone.utc))
+        if change_zone:
+            await database.user_settings.update_one({"user_id": "u1"}, {"$set": {"timezone": "Europe/Paris"}})
+        await scheduler.deliver_due(datetime(2026, 3, 2, 14, 31, tzinfo=timezone.utc))
+        return [m.subject for m in sink.sent]
+
+    assert asyncio.run(run(change_zone=False)) == ["Reminder: 1 Elm St at 10:00"]
+    for name in ("users", "user_settings", "appointments", "notification_deliveries"):
+        asyncio.run(database.drop_collection(name))
+    assert asyncio.run(run(change_zone=True)) == []
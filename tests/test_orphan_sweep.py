@@ -0,0 +1,52 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["orphan_sweep_test"]
+    monkeypatch.setattr(server, "db", database)
+
+    async def seed():
+        await database.clients.insert_one({"id": "c1", "user_id": "u1"})
+        await database.appointments.insert_many([
+            {"id": "a1", "user_id": "u1", "client_id": "c1"},
+            {"id": "a2", "user_id": "u1", "client_id": "gone"},
+        ])
+    asyncio.run(seed())
+    return database
+
+
+def test_only_the_lease_holder_sweeps(database, monkeypatch):
+    async def run():
+        monkeypatch.setattr(server, "WORKER_ID", "other-worker")
+        assert await server.acquire_lock(server.ORPHAN_SWEEP_LOCK)
+        monkeypatch.setattr(server, "WORKER_ID", "this-worker")
+        assert await server.sweep_orphans_leased() is None
+        assert await database.appointments.count_documents({}) == 2
+
+        await database.locks.update_one(
+            {"_id": server.ORPHAN_SWEEP_LOCK}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+        )
+        assert await server.sweep_orphans_leased() == {"appointments": 1, "house_notes": 0}
+        assert await database.appointments.distinct("id") == ["a1"]
+        assert await database.tombstones.count_documents({}) == 1
+        # Released once done, so the next interval's sweep can run on any worker
+        assert await database.locks.count_documents({}) == 0
+    asyncio.run(run())
+
+
+def test_sweep_stops_when_the_lease_is_lost(database, monkeypatch):
+    async def run():
+        monkeypatch.setattr(server, "WORKER_ID", "other-worker")
+        assert await server.acquire_lock(server.ORPHAN_SWEEP_LOCK)
+        monkeypatch.setattr(server, "WORKER_ID", "this-worker")
+        assert await server.sweep_orphans(server.ORPHAN_SWEEP_LOCK) == {"appointments": 0, "house_notes": 0}
+        assert await database.appointments.count_documents({}) == 2
+    asyncio.run(run())
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+import httpx
+
+import profiling
+
+
+def profiled(app, monkeypatch) -> dict:
+    """Run one header-profiled request through `app` and return its profile summary"""
+    monkeypatch.setenv("PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "PROFILES", profiling.ProfileStore(5))
+    middleware = profiling.ProfilingMiddleware(app)
+
+    async def request():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.get("/", headers={"X-Profile": "secret"})
+
+    response = asyncio.run(request())
+    return profiling.PROFILES.get(response.headers["x-profile-id"])
+
+
+def responding(work):
+    async def app(scope, receive, send):
+        await work()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+
+def test_awaiting_counts_as_other_not_cpu(monkeypatch):
+    async def wait():
+        await asyncio.sleep(0.3)
+
+    profile = profiled(responding(wait), monkeypatch)
+    assert profile["breakdown_ms"]["cpu"] < 100
+    assert profile["breakdown_ms"]["other"] > 200
+    assert not any("select." in f["function"] for f in profile["functions"])
+
+
+def test_busy_work_counts_as_cpu(monkeypatch):
+    async def spin():
+        deadline = time.thread_time() + 0.2
+        while time.thread_time() < deadline:
+            pass
+
+    profile = profiled(responding(spin), monkeypatch)
+    assert profile["breakdown_ms"]["cpu"] >= 150
@@ -0,0 +1,113 @@
+import random
+
+from scheduling import Interval, IntervalTree, find_conflicts, day_conflicts, free_slots
+
+
+def interval(start, end, name="", **fields):
+    return Interval(start, end, {"id": name or f"{start}-{end}", **fields})
+
+
+def no_travel(origin, destination):
+    return None
+
+
+def fixed_travel(minutes):
+    return lambda origin, destination: minutes
+
+
+def test_overlapping_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(50):
+        intervals = []
+        for i in range(rng.randrange(0, 40)):
+            start = rng.randrange(0, 1400)
+            intervals.append(interval(start, start + rng.randrange(1, 180), name=str(i)))
+        tree = IntervalTree(intervals)
+        for _ in range(20):
+            start = rng.randrange(0, 1440)
+            end = start + rng.randrange(1, 240)
+            expected = {i.item["id"] for i in intervals if i.start < end and i.end > start}
+            assert {i.item["id"] for i in tree.overlapping(start, end)} == expected
+
+
+def test_touching_intervals_do_not_overlap():
+    tree = IntervalTree([interval(600, 660), interval(720, 780)])
+    assert tree.overlapping(660, 720) == []
+    assert [i.item["id"] for i in tree.overlapping(659, 721)] == ["600-660", "720-780"]
+
+
+def test_previous_and_next():
+    tree = IntervalTree([interval(540, 600), interval(600, 700), interval(800, 840)])
+    assert tree.previous(700).item["id"] == "600-700"
+    assert tree.previous(539) is None
+    assert tree.next(700).item["id"] == "800-840"
+    assert tree.next(841) is None
+
+
+def test_empty_tree():
+    tree = IntervalTree([])
+    assert len(tree) == 0
+    assert tree.overlapping(0, 1440) == []
+    assert tree.previous(600) is None and tree.next(600) is None
+
+
+def test_find_conflicts_reports_overlap_minutes():
+    tree = IntervalTree([interval(600, 660, "a")])
+    conflicts = find_conflicts(tree, interval(630, 700, "new"), no_travel)
+    assert [(c.kind, c.other.item["id"], c.overlap_minutes) for c in conflicts] == [("overlap", "a", 30)]
+
+
+def test_find_conflicts_reports_short_travel_gaps():
+    tree = IntervalTree([interval(600, 660, "before"), interval(760, 800, "after")])
+    conflicts = find_conflicts(tree, interval(670, 745, "new"), fixed_travel(15))
+    assert [(c.kind, c.other.item["id"], c.travel_minutes, c.gap_minutes) for c in conflicts] == [
+        ("travel", "before", 15, 10),
+    ]
+    conflicts = find_conflicts(tree, interval(670, 750, "new"), fixed_travel(20))
+    assert [(c.other.item["id"], c.gap_minutes) for c in conflicts] == [("before", 10), ("after", 10)]
+
+
+def test_find_conflicts_ignores_unknown_travel():
+    tree = IntervalTree([interval(600, 660, "before")])
+    assert find_conflicts(tree, interval(660, 720, "new"), no_travel) == []
+
+
+def test_day_conflicts_reports_each_pair_once():
+    tree = IntervalTree([interval(600, 700, "a"), interval(650, 720, "b"), interval(730, 760, "c")])
+    conflicts = day_conflicts(tree, fixed_travel(20))
+    pairs = sorted((c.kind, c.interval.item["id"], c.other.item["id"]) for c in conflicts)
+    assert pairs == [("overlap", "a", "b"), ("travel", "b", "c")]
+
+
+def test_free_slots_on_an_empty_day():
+    slots = free_slots([], 540, 1080, 60, {}, no_travel)
+    assert [(s.start, s.end, s.window_start, s.window_end) for s in slots] == [(540, 600, 540, 1080)]
+
+
+def test_free_slots_shrink_gaps_by_travel_and_round_to_step():
+    booked = [interval(540, 610, "a"), interval(720, 780, "b")]
+    slots = free_slots(booked, 540, 1080, 45, {}, fixed_travel(10))
+    # 610 + 10 min drive = 620, rounded up to 630; 630 + 45 <= 720 - 10
+    assert [(s.start, s.end, s.travel_before, s.travel_after) for s in slots] == [
+        (630, 675, 10, 10),
+        (795, 840, 10, None),
+    ]
+
+
+def test_free_slots_skip_gaps_too_short_after_travel():
+    booked = [interval(540, 600, "a"), interval(660, 720, "b")]
+    slots = free_slots(booked, 540, 720, 45, {}, fixed_travel(10))
+    assert slots == []
+
+
+def test_free_slots_handle_nested_and_out_of_hours_bookings():
+    booked = [interval(400, 500, "early"), interval(540, 720, "long"), interval(600, 630, "inside"),
+              interval(1100, 1200, "late")]
+    slots = free_slots(booked, 540, 1080, 60, {}, no_travel)
+    assert [(s.start, s.window_start, s.window_end) for s in slots] == [(720, 720, 1080)]
+
+
+def test_free_slots_leave_travel_time_to_a_booking_after_hours():
+    slots = free_slots([interval(1080, 1140, "late")], 960, 1080, 60, {}, fixed_travel(30))
+    assert [(s.start, s.end, s.window_end, s.travel_after) for s in slots] == [(960, 1020, 1080, 30)]
+    assert free_slots([interval(1080, 1140, "late")], 960, 1080, 100, {}, fixed_travel(30)) == []